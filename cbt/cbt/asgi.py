@@ -14,3 +14,10 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cbt.settings')
 
 application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.WARMUP_ON_BOOT:
+    import logging
+    from cbt_app.warmup import warm_up_on_boot
+    logging.getLogger(__name__).info("cbt warm-up: %s", warm_up_on_boot())
@@ -29,6 +29,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'cbt_app.middleware.ReplicaStickinessMiddleware',
+    'cbt_app.middleware.SamplingProfilerMiddleware',
 ]
 
 ROOT_URLCONF = 'cbt.urls'
@@ -61,6 +63,70 @@ DATABASES = {
     }
 }
 
+# Read replica for read-only traffic (see cbt_app/db_routers.py).
+# Locally a copy of the primary stands in for it: cp db.sqlite3 db_replica.sqlite3
+USE_READ_REPLICA = False
+# after a write, that client's reads stay on the primary this long
+REPLICA_STICKY_SECONDS = 10
+
+if USE_READ_REPLICA:
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db_replica.sqlite3',
+        'TEST': {'MIRROR': 'default'},
+    }
+
+# Optional per-exam sharding of session data (see cbt_app/sharding.py).
+# Keep 'default' first so sessions written before sharding stay reachable;
+# pin exams that already have sessions to 'default' in SESSION_SHARD_MAP.
+# Locally each extra alias is its own SQLite file: migrate --database shard1
+SESSION_SHARDS = []  # e.g. ['default', 'shard1', 'shard2']
+SESSION_SHARD_MAP = {}  # exam_id -> alias, overrides exam_id % len(SESSION_SHARDS)
+
+for _alias in SESSION_SHARDS:
+    if _alias not in DATABASES:
+        DATABASES[_alias] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / f'db_{_alias}.sqlite3',
+        }
+
+DATABASE_ROUTERS = ['cbt_app.db_routers.ShardRouter', 'cbt_app.db_routers.ReplicaRouter']
+
+# Keep in-progress session state in the cache and write it back in batches
+# (see cbt_app/live_state.py for crash-recovery semantics). Use a shared
+# cache backend when running more than one worker.
+LIVE_SESSION_STATE = False
+LIVE_SESSION_FLUSH_SECONDS = 30  # background flush interval, per worker
+
+# How long grading trusts a cached Exam.bank_version (see
+# cbt_app/question_index.py). Edits clear it at once; only used with a
+# shared cache backend, a per-process cache reads the version every time.
+BANK_VERSION_CACHE_SECONDS = 30
+
+# archive_sessions moves finished sessions older than this out of ExamSession
+SESSION_ARCHIVE_RETENTION_DAYS = 180
+
+# Sampled cProfile of hot endpoints; inspect with `manage.py profile_hotspots`
+PROFILER = {
+    'ENABLED': False,
+    'ROUTES': ['/api/adaptive/next/', '/api/adaptive/check_answer/'],
+    'SAMPLE_RATE': 1000,  # profile 1 in N matching requests
+    'SLOW_MS': None,      # also keep requests slower than this (profiles every match)
+    'DIR': BASE_DIR / 'profiles',
+    'MAX_FILES': 200,
+}
+
+# Prime question indexes when a wsgi/asgi worker boots (cbt_app/warmup.py)
+WARMUP_ON_BOOT = True
+
+# Django's defaults plus INFO from this project's own loggers (e.g. the warm-up report)
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {'console': {'class': 'logging.StreamHandler'}},
+    'loggers': {'cbt': {'handlers': ['console'], 'level': 'INFO'}},
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -97,7 +163,12 @@ CSRF_TRUSTED_ORIGINS = [
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
-    )
+    ),
+    # token-bucket rates per user, see cbt_app/throttling.py
+    'DEFAULT_THROTTLE_RATES': {
+        'adaptive_answer': '30/min',
+        'adaptive_status': '60/min',
+    },
 }
 
 SIMPLE_JWT = {
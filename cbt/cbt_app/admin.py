@@ -1,5 +1,92 @@
-from django.contrib import admin
-from .models import Exam, Question, ExamSession
+from django.contrib import admin, messages
+from django.contrib.auth.models import User
+from django.db.models import Q
+
+from . import rescoring, sharding
+from .models import Exam, Question, ExamSession, ArchivedExamSession
+from .paginators import EstimatedCountPaginator, estimate_rows
+
+
+class UsernameFilter(admin.SimpleListFilter):
+    """Type-in username filter, so the sidebar never lists every user."""
+    title = 'username'
+    parameter_name = 'username'
+    template = 'admin/input_filter.html'
+
+    def lookups(self, request, model_admin):
+        return ((),)  # non-empty so the filter is rendered
+
+    def queryset(self, request, queryset):
+        if self.value():
+            # resolved on default: sharded session tables can't join to auth_user
+            user_ids = list(User.objects.filter(username=self.value()).values_list('id', flat=True))
+            return queryset.filter(user_id__in=user_ids)
+        return queryset
+
+    def choices(self, changelist):
+        # keep the other filters/search/ordering when the form is submitted
+        all_choice = next(super().choices(changelist))
+        all_choice['query_parts'] = [
+            (k, v) for k, v in changelist.params.items() if k not in (self.parameter_name, 'p')
+        ]
+        yield all_choice
+
+
+class ShardFilter(admin.SimpleListFilter):
+    """
+    Which shard the session changelist reads. Defaults to the filtered exam's
+    shard, else the first one; each choice shows an estimated row count.
+    """
+    title = 'shard'
+    parameter_name = 'shard'
+
+    def lookups(self, request, model_admin):
+        return [
+            (alias, f'{alias} (~{estimate_rows(model_admin.model, using=alias)})')
+            for alias in sharding.aliases()
+        ]
+
+    def _alias(self, request):
+        if self.value() in sharding.aliases():
+            return self.value()
+        exam_id = request.GET.get('exam__id__exact')
+        if exam_id and exam_id.isdigit():
+            return sharding.shard_for_exam(int(exam_id))
+        return sharding.aliases()[0]
+
+    def queryset(self, request, queryset):
+        return queryset.using(self._alias(request))
+
+    def choices(self, changelist):
+        # no "All": a changelist reads one database
+        current = self._alias(self.request)
+        for alias, title in self.lookup_choices:
+            yield {
+                'selected': alias == current,
+                'query_string': changelist.get_query_string({self.parameter_name: alias}),
+                'display': title,
+            }
+
+
+class SessionSearchMixin:
+    """
+    Search sessions by exact username or exam-name prefix (case-sensitive).
+    Django compiles '=user__username' / '^exam__name' to LIKE, which scans
+    the session table, so ids are resolved on default with lookups that use
+    the auth_user and Exam.name indexes, then matched on user_id / exam_id.
+    Also works with sharding on, where sessions can't join to either table.
+    """
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        user_ids = User.objects.filter(username=search_term).values_list('id', flat=True)
+        # prefix as a range: [term, term with its last character bumped)
+        upper = search_term[:-1] + chr(ord(search_term[-1]) + 1)
+        exam_ids = Exam.objects.filter(name__gte=search_term, name__lt=upper).values_list('id', flat=True)
+        return queryset.filter(Q(user_id__in=list(user_ids)) | Q(exam_id__in=list(exam_ids))), False
+
 
 @admin.register(Exam)
 class ExamAdmin(admin.ModelAdmin):
@@ -9,11 +96,67 @@ class ExamAdmin(admin.ModelAdmin):
 @admin.register(Question)
 class QuestionAdmin(admin.ModelAdmin):
     list_display = ('id', 'exam', 'text', 'correct_option')
-    list_filter = ('exam',)
+    list_filter = ('exam', 'difficulty')
+    list_select_related = ('exam',)
     search_fields = ('text',)
+    autocomplete_fields = ('exam',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ('preview_rescore', 'rescore_sessions')
+
+    def _rescore_message(self, reports):
+        gained = sum(r['gained'] for r in reports)
+        lost = sum(r['lost'] for r in reports)
+        return f"{len(reports)} question(s): +1 for {gained} session(s), -1 for {lost} session(s)"
+
+    @admin.action(description="Preview rescoring of closed sessions (dry run)")
+    def preview_rescore(self, request, queryset):
+        reports = rescoring.rescore(queryset.values_list('id', flat=True), dry_run=True)
+        skipped = sum(r['unfinished_skipped'] for r in reports)
+        self.message_user(request, f"Would change {self._rescore_message(reports)}; "
+                                   f"{skipped} answer(s) in open sessions skipped.")
+
+    @admin.action(description="Rescore closed sessions against the current key")
+    def rescore_sessions(self, request, queryset):
+        reports = rescoring.rescore(queryset.values_list('id', flat=True))
+        self.message_user(request, f"Rescored {self._rescore_message(reports)}.", messages.SUCCESS)
 
 @admin.register(ExamSession)
-class ExamSessionAdmin(admin.ModelAdmin):
+class ExamSessionAdmin(SessionSearchMixin, admin.ModelAdmin):
     list_display = ('id', 'user', 'exam', 'current_question', 'score')
-    list_filter = ('user', 'exam')
-    search_fields = ('user__username', 'exam__name')
\ No newline at end of file
+    list_filter = (UsernameFilter, 'exam', 'is_finished')
+    list_select_related = ('user', 'exam')
+    # shows the search box; matching is done by SessionSearchMixin
+    search_fields = ('=user__username', '^exam__name')
+    autocomplete_fields = ('user', 'exam')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    # With sharding on, sessions can't join to users/exams: pick the shard
+    # and prefetch names from default.
+    def get_list_filter(self, request):
+        if sharding.enabled():
+            return (ShardFilter,) + self.list_filter
+        return self.list_filter
+
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        return qs.prefetch_related('user', 'exam') if sharding.enabled() else qs
+
+    def get_list_select_related(self, request):
+        return () if sharding.enabled() else self.list_select_related  # False would mean 'auto'
+
+    def get_object(self, request, object_id, from_field=None):
+        if sharding.enabled() and from_field is None and str(object_id).isdigit():
+            return self.get_queryset(request).using(sharding.shard_for_id(object_id)).filter(pk=object_id).first()
+        return super().get_object(request, object_id, from_field)
+
+
+@admin.register(ArchivedExamSession)
+class ArchivedExamSessionAdmin(SessionSearchMixin, admin.ModelAdmin):
+    list_display = ('id', 'user', 'exam', 'score', 'answered_count', 'finished_at')
+    list_filter = (UsernameFilter, 'exam')
+    list_select_related = ('user', 'exam')
+    search_fields = ('=user__username', '^exam__name')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
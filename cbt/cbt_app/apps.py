@@ -1,6 +1,22 @@
+import atexit
+
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class CbtAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'cbt_app'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from . import live_state, question_index
+        question_index.configure()
+        if live_state.enabled():
+            atexit.register(live_state.flush)
+        post_migrate.connect(_reserve_shard_ids, sender=self)
+
+
+def _reserve_shard_ids(sender, using, **kwargs):
+    from . import sharding
+    sharding.reserve_id_range(using, sender.get_models())
@@ -0,0 +1,66 @@
+"""
+Moving finished sessions out of the hot ExamSession table.
+Readers that need full history (exports, stats rebuild) use the
+*_rows helpers here, which cover both tables. The archive itself always
+lives on default; with sharding on, sessions are moved shard by shard.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import sharding
+from .models import ArchivedExamSession, ExamSession
+
+
+def archivable(retention_days):
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    return ExamSession.objects.filter(is_finished=True, finished_at__lt=cutoff)
+
+
+def archive_batch(retention_days, batch_size) -> int:
+    """
+    Copy one batch of old finished sessions into the archive and delete them.
+    Returns the number moved (0 = nothing left on any shard).
+    """
+    for alias in sharding.aliases():
+        moved = _archive_shard_batch(alias, retention_days, batch_size)
+        if moved:
+            return moved
+    return 0
+
+
+def _archive_shard_batch(alias, retention_days, batch_size) -> int:
+    """
+    One batch from one shard. On default this is a single transaction; on
+    other shards the archive insert commits first, and a crash before the
+    delete is repaired by the next run (the insert ignores existing ids).
+    """
+    # the inner (default) block commits first: archive rows exist before the delete commits
+    with transaction.atomic(using=alias), transaction.atomic():
+        batch = list(
+            archivable(retention_days).using(alias).order_by('id').values_list(
+                'id', 'user_id', 'exam_id', 'score', 'asked_question_ids',
+                'current_difficulty', 'started_at', 'finished_at',
+            )[:batch_size]
+        )
+        if not batch:
+            return 0
+        ArchivedExamSession.objects.bulk_create([
+            ArchivedExamSession(
+                id=sid, user_id=user_id, exam_id=exam_id, score=score,
+                answered_count=len(asked or []), final_difficulty=difficulty,
+                started_at=started_at, finished_at=finished_at,
+            )
+            for sid, user_id, exam_id, score, asked, difficulty, started_at, finished_at in batch
+        ], ignore_conflicts=True)
+        ExamSession.objects.using(alias).filter(id__in=[row[0] for row in batch]).delete()
+    return len(batch)
+
+
+def finished_score_rows(exam_id):
+    """(score, started_at, finished_at) for every finished attempt, live and archived."""
+    live = ExamSession.objects.for_exam(exam_id).filter(is_finished=True)
+    archived = ArchivedExamSession.objects.filter(exam_id=exam_id)
+    for qs in (live, archived):
+        yield from qs.values_list('score', 'started_at', 'finished_at').iterator(chunk_size=5000)
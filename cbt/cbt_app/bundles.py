@@ -0,0 +1,44 @@
+"""
+Bundle mode for fixed-form (non-adaptive) sessions: the whole question set
+is sent once at begin and answers come back in batches.
+"""
+from . import question_index
+from .models import Question
+
+# column order of each row in the bundle; correct_option is never included
+BUNDLE_FIELDS = ['id', 'text', 'option1', 'option2', 'option3', 'option4', 'difficulty', 'topic']
+
+
+def bundle_payload(exam) -> dict:
+    """Ordered question set as columns + rows, without correct answers."""
+    rows = Question.objects.filter(exam=exam).order_by('id').values_list(*BUNDLE_FIELDS)
+    return {"fields": BUNDLE_FIELDS, "rows": [list(r) for r in rows]}
+
+
+def parse_answers(raw) -> dict:
+    """
+    Accept {"<question_id>": answer, ...} or [[question_id, answer], ...].
+    Raises ValueError on anything else.
+    """
+    pairs = raw.items() if isinstance(raw, dict) else raw
+    answers = {}
+    for qid, answer in pairs:
+        answer = int(answer)
+        if answer not in (1, 2, 3, 4):
+            raise ValueError(f"Answer for question {qid} must be 1-4.")
+        answers[int(qid)] = answer
+    return answers
+
+
+def grade(exam, answers: dict) -> dict:
+    """
+    Grade all answers against the exam's in-memory answer key (no queries).
+    Returns {question_id: is_correct}; ids not in the exam are left out.
+    """
+    index = question_index.get_index(exam)
+    results = {}
+    for qid, chosen in answers.items():
+        key = index.answer(qid)
+        if key is not None:
+            results[qid] = chosen == key[0]
+    return results
@@ -0,0 +1,133 @@
+from functools import wraps
+
+from asgiref.local import Local
+from django.conf import settings
+from django.db import connections
+
+from . import sharding
+
+REPLICA_ALIAS = 'replica'
+
+# per-request routing state, maintained by ReplicaStickinessMiddleware
+_state = Local()
+
+
+def reset(pinned=False):
+    _state.pinned = pinned
+    _state.wrote = False
+    _state.replica_ok = False
+
+
+def replica_reads(view):
+    """
+    Mark a read-only view: its plain reads may go to the replica. Every other
+    view reads from default, so a read-modify-write (read, change, save())
+    never starts from a lagging replica row.
+    """
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        previous = getattr(_state, 'replica_ok', False)
+        _state.replica_ok = True
+        try:
+            return view(*args, **kwargs)
+        finally:
+            _state.replica_ok = previous
+    return wrapped
+
+
+def iter_replica_reads(iterable):
+    """Like replica_reads, for a streamed body consumed after the view has returned."""
+    it = iter(iterable)
+    while True:
+        previous = getattr(_state, 'replica_ok', False)
+        _state.replica_ok = True
+        try:
+            item = next(it)
+        except StopIteration:
+            return
+        finally:
+            _state.replica_ok = previous
+        yield item
+
+
+def mark_write():
+    _state.wrote = True
+
+
+def wrote() -> bool:
+    return getattr(_state, 'wrote', False)
+
+
+def _use_primary() -> bool:
+    return (
+        not getattr(_state, 'replica_ok', False)
+        or getattr(_state, 'pinned', False)
+        or wrote()
+        or connections['default'].in_atomic_block
+    )
+
+
+class ReplicaRouter:
+    """
+    Send reads from views marked @replica_reads to the replica, everything
+    else to default. Even there, reads stay on default once the current
+    request has written, inside a transaction, or while the client is
+    pinned after a recent write.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not settings.USE_READ_REPLICA or _use_primary():
+            return 'default'
+        return REPLICA_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # the replica gets its schema from replication (or a file copy locally)
+        return db != REPLICA_ALIAS
+
+
+class ShardRouter:
+    """
+    Route sharded models (sharding.SHARDED_MODELS) to their exam's shard.
+    Needs an instance hint (saves, related lookups); querysets pick the shard
+    explicitly with for_exam() / using(). Everything else falls through to
+    the next router. List it first in DATABASE_ROUTERS.
+    """
+
+    def _shard(self, model, hints):
+        if not sharding.enabled() or not sharding.is_sharded(model):
+            return None
+        instance = hints.get('instance')
+        if instance is None:
+            return None
+        if sharding.is_sharded(type(instance)):
+            if instance._state.db:
+                return instance._state.db
+            if instance.exam_id is not None:
+                return sharding.shard_for_exam(instance.exam_id)
+            return None
+        if instance._meta.label_lower == 'cbt_app.exam':
+            return sharding.shard_for_exam(instance.pk)
+        return None
+
+    def db_for_read(self, model, **hints):
+        return self._shard(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._shard(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if sharding.is_sharded(type(obj1)) or sharding.is_sharded(type(obj2)):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == 'default' or db not in sharding.aliases():
+            return None
+        # shards hold only the sharded tables
+        return f'{app_label}.{model_name}' in sharding.SHARDED_MODELS
@@ -0,0 +1,96 @@
+import csv
+import json
+from itertools import islice
+
+from django.contrib.auth.models import User
+
+from . import sharding
+from .models import ArchivedExamSession, Exam, ExamSession
+
+EXPORT_FIELDS = [
+    'session_id', 'username', 'exam_id', 'exam_name', 'score', 'answered_count',
+    'final_difficulty', 'started_at', 'finished_at', 'is_finished',
+]
+
+CHUNK_SIZE = 2000
+
+
+class _Echo:
+    """File-like object whose write() just hands the line back (for csv.writer)."""
+    def write(self, value):
+        return value
+
+
+def _iso(dt):
+    return dt.isoformat() if dt else None
+
+
+def session_rows(exam_id=None):
+    """
+    Yield one dict per session: archived sessions first, then ExamSession
+    from every shard, each in id order. Uses values_list + iterator() so
+    memory stays flat regardless of row count. Live rows may sit on a shard
+    without the user/exam tables, so names are looked up per chunk.
+    """
+    archived = ArchivedExamSession.objects.order_by('id')
+    live = ExamSession.objects.order_by('id')
+    if exam_id is not None:
+        archived = archived.filter(exam_id=exam_id)
+        live = live.filter(exam_id=exam_id)
+
+    rows = archived.values_list(
+        'id', 'user__username', 'exam_id', 'exam__name', 'score', 'answered_count',
+        'final_difficulty', 'started_at', 'finished_at',
+    ).iterator(chunk_size=CHUNK_SIZE)
+    for (sid, username, eid, exam_name, score, answered, difficulty,
+         started_at, finished_at) in rows:
+        yield _row(sid, username, eid, exam_name, score, answered, difficulty,
+                   started_at, finished_at, True)
+
+    rows = sharding.iterate(live.values_list(
+        'id', 'user_id', 'exam_id', 'score', 'asked_question_ids',
+        'current_difficulty', 'started_at', 'finished_at', 'is_finished',
+    ), chunk_size=CHUNK_SIZE)
+    exam_names = {}
+    while chunk := list(islice(rows, CHUNK_SIZE)):
+        usernames = dict(User.objects.filter(id__in={r[1] for r in chunk}).values_list('id', 'username'))
+        missing = {r[2] for r in chunk} - exam_names.keys()
+        if missing:
+            exam_names.update(Exam.objects.filter(id__in=missing).values_list('id', 'name'))
+        for (sid, user_id, eid, score, asked, difficulty,
+             started_at, finished_at, is_finished) in chunk:
+            yield _row(sid, usernames.get(user_id), eid, exam_names.get(eid), score,
+                       len(asked or []), difficulty, started_at, finished_at, is_finished)
+
+
+def _row(sid, username, eid, exam_name, score, answered, difficulty, started_at, finished_at, is_finished):
+    return {
+        'session_id': sid,
+        'username': username,
+        'exam_id': eid,
+        'exam_name': exam_name,
+        'score': score,
+        'answered_count': answered,
+        'final_difficulty': difficulty,
+        'started_at': _iso(started_at),
+        'finished_at': _iso(finished_at),
+        'is_finished': is_finished,
+    }
+
+
+def iter_csv(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        yield writer.writerow([row[f] for f in EXPORT_FIELDS])
+
+
+def iter_jsonl(rows):
+    for row in rows:
+        yield json.dumps(row) + '\n'
+
+
+RENDERERS = {
+    'csv': (iter_csv, 'text/csv'),
+    'jsonl': (iter_jsonl, 'application/x-ndjson'),
+}
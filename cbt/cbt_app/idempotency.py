@@ -0,0 +1,62 @@
+import functools
+import hashlib
+import json
+
+from django.core.cache import cache
+from rest_framework.response import Response
+
+IDEMPOTENCY_TTL_SECONDS = 15 * 60
+LOCK_SECONDS = 30
+
+
+def _data_digest(request) -> str:
+    """
+    Hash of the parsed request data. request.body can't be used: for form
+    and multipart requests it is gone once request.data has been parsed.
+    """
+    data = request.data
+    if hasattr(data, 'lists'):  # QueryDict
+        data = sorted(data.lists())
+    return hashlib.sha1(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def idempotent(derive_key):
+    """
+    Replay the first successful response for a repeated request.
+    The key is the Idempotency-Key header, else derive_key(request, *args,
+    **kwargs); keys are scoped per user and view. Replays never reach the
+    view, so the session row is untouched. A duplicate arriving while the
+    first is still running gets 409; a key reused with a different request
+    body gets 422 instead of the first response.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapped(request, *args, **kwargs):
+            key = request.headers.get('Idempotency-Key') or derive_key(request, *args, **kwargs)
+            digest = hashlib.sha1(str(key).encode()).hexdigest()
+            cache_key = f'cbt:idem:{view.__name__}:{request.user.pk}:{digest}'
+            body_digest = _data_digest(request)
+
+            stored = cache.get(cache_key)
+            if stored is not None:
+                data, status, stored_body_digest = stored
+                if stored_body_digest != body_digest:
+                    return Response({"error": "This idempotency key was used with a different request."},
+                                    status=422)
+                response = Response(data, status=status)
+                response['Idempotent-Replayed'] = 'true'
+                return response
+
+            lock_key = cache_key + ':lock'
+            if not cache.add(lock_key, 1, LOCK_SECONDS):
+                return Response({"error": "A request with this key is already in progress."}, status=409)
+            try:
+                response = view(request, *args, **kwargs)
+                if 200 <= response.status_code < 300:
+                    cache.set(cache_key, (response.data, response.status_code, body_digest),
+                              IDEMPOTENCY_TTL_SECONDS)
+            finally:
+                cache.delete(lock_key)
+            return response
+        return wrapped
+    return decorator
@@ -0,0 +1,197 @@
+"""
+Optional cache-resident state for in-progress exam sessions.
+
+With LIVE_SESSION_STATE on, the per-question fields of ExamSession live in
+the Django cache and are written back to the table in batches:
+  - every LIVE_SESSION_FLUSH_SECONDS, by a background thread in each worker
+    (started by the worker's first live save), so no request pays for it,
+  - when the session is finalized,
+  - at process exit (atexit; covers gunicorn's graceful SIGTERM).
+Graded answers (SessionAnswer rows) are buffered in the same entry and
+inserted by the same flush, so live mode keeps the answer path write-free.
+
+Each worker only flushes the sessions it saved itself (its dirty set).
+Crash recovery: the ExamSession row is only as fresh as the last flush.
+  - Worker crash with a shared cache (redis/memcached): the live entry is
+    still in the cache, but the crashed worker's dirty set is gone. If the
+    candidate continues, the entry is served to the next request and
+    flushed by whichever worker handles it. If they never come back it is
+    never flushed, and it expires after LIVE_TTL_SECONDS: the row keeps its
+    last flushed state, as below. A timed-out session is written back when
+    it is rescored (see retire()).
+  - Worker crash with a process-local cache (the default LocMemCache), or
+    the entry being evicted: the session falls back to its last flushed
+    row, i.e. up to LIVE_SESSION_FLUSH_SECONDS of answers are replayed as
+    unanswered. Scores never include answers that were lost, and no
+    SessionAnswer row is left behind for them either.
+Edits made directly to these fields (admin, shell) while a session is live
+are overwritten by the next flush.
+"""
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+
+from . import sharding
+from .models import ExamSession, SessionAnswer
+
+LIVE_FIELDS = (
+    'asked_question_ids', 'current_difficulty', 'correct_streak', 'incorrect_streak',
+    'pending_question_id', 'speculative_next', 'score',
+)
+
+FLUSH_BATCH_SIZE = 500
+# well past any exam length; entries are deleted at finalize anyway
+LIVE_TTL_SECONDS = 24 * 60 * 60
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_dirty = set()
+_flusher_pid = None
+
+
+def enabled() -> bool:
+    return getattr(settings, 'LIVE_SESSION_STATE', False)
+
+
+def _key(session_id) -> str:
+    return f'cbt:live:{session_id}'
+
+
+def overlay(session: ExamSession) -> ExamSession:
+    """Replace the row's hot fields with the live copy, if there is one."""
+    if enabled():
+        state = cache.get(_key(session.id))
+        if state:
+            for field in LIVE_FIELDS:
+                setattr(session, field, state[field])
+            session._live_answers = state.get('answers', [])
+    return session
+
+
+def add_answers(session: ExamSession, graded):
+    """Buffer (question_id, chosen_option, is_correct) rows until the next flush."""
+    session._live_answers = getattr(session, '_live_answers', []) + [list(row) for row in graded]
+
+
+def _answer_rows(session_id, exam_id, answers):
+    return [
+        SessionAnswer(session_id=session_id, exam_id=exam_id, question_id=qid,
+                      chosen_option=chosen, is_correct=ok)
+        for qid, chosen, ok in answers
+    ]
+
+
+def load_session(user, exam) -> ExamSession:
+    """`exam` may be an Exam or just its id."""
+    session, _ = ExamSession.objects.for_exam(exam).get_or_create(
+        user=user, exam_id=getattr(exam, 'pk', exam),
+        defaults={'current_difficulty': 2, 'adaptive': True}
+    )
+    return overlay(session)
+
+
+def save_session(session: ExamSession):
+    """Hot-path save: cache only in live mode, a normal row save otherwise."""
+    if not enabled():
+        session.save()
+        return
+    state = {f: getattr(session, f) for f in LIVE_FIELDS}
+    state['exam_id'] = session.exam_id
+    state['answers'] = getattr(session, '_live_answers', [])
+    cache.set(_key(session.id), state, LIVE_TTL_SECONDS)
+    with _lock:
+        _dirty.add(session.id)
+    _start_flusher()
+
+
+def _start_flusher():
+    """
+    Start this process's flush thread once. Started lazily rather than in
+    AppConfig.ready, because gunicorn --preload forks workers after ready()
+    and threads don't survive a fork.
+    """
+    global _flusher_pid
+    with _lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+    threading.Thread(target=_flush_loop, name='cbt-live-flush', daemon=True).start()
+
+
+def _flush_loop():
+    while True:
+        time.sleep(settings.LIVE_SESSION_FLUSH_SECONDS)
+        try:
+            flush()
+        except Exception:
+            # the sessions stay dirty and are retried next round
+            logger.exception("live session flush failed")
+        finally:
+            connections.close_all()
+
+
+def flush(session_ids=None) -> int:
+    """
+    Write live state to ExamSession with batched bulk_update, plus the
+    buffered answers (already-written ones are skipped by the unique key).
+    Flushes every session this process dirtied, or just `session_ids`.
+    Returns the number of session rows written.
+    """
+    with _lock:
+        ids = set(_dirty) if session_ids is None else set(session_ids)
+        _dirty.difference_update(ids)
+    if not ids:
+        return 0
+    states = cache.get_many([_key(i) for i in ids])
+    by_shard = {}
+    for i in ids:
+        state = states.get(_key(i))
+        if state:
+            rows, answers = by_shard.setdefault(sharding.shard_for_id(i), ([], []))
+            rows.append(ExamSession(id=i, **{f: state[f] for f in LIVE_FIELDS}))
+            answers.extend(_answer_rows(i, state.get('exam_id'), state.get('answers', [])))
+    try:
+        for alias, (rows, answers) in by_shard.items():
+            with transaction.atomic(using=alias):
+                ExamSession.objects.using(alias).bulk_update(rows, LIVE_FIELDS, batch_size=FLUSH_BATCH_SIZE)
+                SessionAnswer.objects.using(alias).bulk_create(
+                    answers, batch_size=FLUSH_BATCH_SIZE, ignore_conflicts=True)
+    except Exception:
+        with _lock:
+            _dirty.update(ids)
+        raise
+    return sum(len(rows) for rows, _ in by_shard.values())
+
+
+def retire(session_ids):
+    """
+    Flush and drop the live copies of sessions that can no longer change
+    (timed out), so the row is the only copy before something rewrites it.
+    """
+    session_ids = set(session_ids)
+    if not enabled() or not session_ids:
+        return
+    flush(session_ids)
+    cache.delete_many([_key(i) for i in session_ids])
+
+
+def discard(session: ExamSession):
+    """
+    Drop the live copy once the row holds the final state (after a full save),
+    writing any answers still buffered on `session` first.
+    """
+    if not enabled():
+        return
+    answers = getattr(session, '_live_answers', None)
+    if answers:
+        SessionAnswer.objects.using(session._state.db or 'default').bulk_create(
+            _answer_rows(session.id, session.exam_id, answers), ignore_conflicts=True)
+    with _lock:
+        _dirty.discard(session.id)
+    cache.delete(_key(session.id))
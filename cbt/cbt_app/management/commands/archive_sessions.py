@@ -0,0 +1,36 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from cbt_app import sharding
+from cbt_app.archive import archivable, archive_batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Move finished sessions older than the retention window into ArchivedExamSession. "
+        "Each batch commits on its own, so the command can be stopped and re-run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.SESSION_ARCHIVE_RETENTION_DAYS)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--sleep', type=float, default=0.5, help="Pause between batches (seconds).")
+        parser.add_argument('--max-batches', type=int, default=None)
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, days, batch_size, sleep, max_batches, dry_run, **options):
+        if dry_run:
+            self.stdout.write(f"{sharding.count(archivable(days))} sessions would be archived")
+            return
+        moved = batches = 0
+        while max_batches is None or batches < max_batches:
+            n = archive_batch(days, batch_size)
+            if not n:
+                break
+            moved += n
+            batches += 1
+            self.stdout.write(f"batch {batches}: archived {n} (total {moved})")
+            time.sleep(sleep)
+        self.stdout.write(f"done: {moved} sessions archived")
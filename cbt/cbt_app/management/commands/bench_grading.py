@@ -0,0 +1,64 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from cbt_app import question_index
+from cbt_app.models import Exam, Question
+from cbt_app.synthetic import generate_exam
+
+
+def orm_grade(exam_id, question_id, answer):
+    """Grading as adaptive_check_answer did before the answer key: two row loads."""
+    exam = Exam.objects.get(id=exam_id)
+    q = Question.objects.get(id=question_id, exam=exam)
+    return answer == q.correct_option
+
+
+def key_grade(exam_id, question_id, answer):
+    correct, _ = question_index.get_index_for(exam_id).answer(question_id)
+    return answer == correct
+
+
+class Command(BaseCommand):
+    help = (
+        "Grading throughput with ORM row loads vs the in-memory answer key. "
+        "The synthetic bank is created inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questions', type=int, default=10000)
+        parser.add_argument('--grades', type=int, default=20000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, questions, grades, seed, **options):
+        rng = random.Random(seed)
+        with transaction.atomic():
+            exam = generate_exam(questions, seed=seed, name='bench-grading')
+            ids = list(Question.objects.filter(exam=exam).values_list('id', flat=True))
+            work = [(rng.choice(ids), rng.randint(1, 4)) for _ in range(grades)]
+
+            start = time.perf_counter()
+            question_index.get_index_for(exam.id)
+            self.stdout.write(f"answer key for {questions} questions built in "
+                              f"{(time.perf_counter() - start) * 1000:.1f} ms")
+
+            for label, grade in (('orm', orm_grade), ('answer key', key_grade)):
+                queries = [0]
+
+                def count(execute, sql, params, many, context):
+                    queries[0] += 1
+                    return execute(sql, params, many, context)
+
+                with connection.execute_wrapper(count):
+                    start = time.perf_counter()
+                    correct = sum(grade(exam.id, qid, answer) for qid, answer in work)
+                    elapsed = time.perf_counter() - start
+                self.stdout.write(
+                    f"{label:>10}: {grades / elapsed:>12,.0f} grades/s | "
+                    f"{elapsed / grades * 1e6:8.2f} us/grade | "
+                    f"{queries[0] / grades:.2f} queries/grade | {correct} correct"
+                )
+            transaction.set_rollback(True)
+        question_index.clear()
@@ -0,0 +1,70 @@
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from cbt_app import rescoring
+from cbt_app.models import ExamSession, Question, SessionAnswer
+from cbt_app.synthetic import generate_exam
+
+BATCH = 5000
+
+
+class Command(BaseCommand):
+    help = (
+        "Time rescoring on synthetic finished sessions: one key change, then every "
+        "key changed at once. Runs inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sessions', type=int, default=100000)
+        parser.add_argument('--questions', type=int, default=20, help="Answers per session.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, sessions, questions, batch_size, seed, **options):
+        rng = random.Random(seed)
+        with transaction.atomic():
+            start = time.perf_counter()
+            exam = generate_exam(questions, seed=seed, name='bench-rescoring')
+            user = User.objects.create_user('bench-rescoring')
+            key = dict(Question.objects.filter(exam=exam).values_list('id', 'correct_option'))
+            self._seed(exam, user, key, sessions, rng)
+            self.stdout.write(f"seeded {sessions} sessions x {questions} answers "
+                              f"in {time.perf_counter() - start:.1f}s")
+
+            first = min(key)
+            Question.objects.filter(id=first).update(correct_option=key[first] % 4 + 1)
+            self._run("dry run, 1 question", [first], batch_size, sessions, dry_run=True)
+            self._run("apply, 1 question", [first], batch_size, sessions)
+            self._run("re-run, 1 question", [first], batch_size, sessions)
+
+            for qid, correct in key.items():
+                Question.objects.filter(id=qid).update(correct_option=correct % 4 + 1)
+            self._run(f"apply, {questions} questions", list(key), batch_size, sessions * questions)
+            transaction.set_rollback(True)
+
+    def _seed(self, exam, user, key, count, rng):
+        qids = sorted(key)
+        for offset in range(0, count, BATCH):
+            choices = [[rng.randint(1, 4) for _ in qids] for _ in range(min(BATCH, count - offset))]
+            batch = ExamSession.objects.bulk_create([
+                ExamSession(user=user, exam=exam, is_finished=True, adaptive=False,
+                            score=sum(c == key[qid] for c, qid in zip(chosen, qids)))
+                for chosen in choices
+            ])
+            SessionAnswer.objects.bulk_create([
+                SessionAnswer(session_id=s.id, exam=exam, question_id=qid,
+                              chosen_option=c, is_correct=c == key[qid])
+                for s, chosen in zip(batch, choices) for c, qid in zip(chosen, qids)
+            ], batch_size=BATCH)
+
+    def _run(self, label, question_ids, batch_size, answers, dry_run=False):
+        start = time.perf_counter()
+        reports = rescoring.rescore(question_ids, batch_size=batch_size, dry_run=dry_run)
+        elapsed = time.perf_counter() - start
+        changed = sum(r['gained'] + r['lost'] for r in reports)
+        self.stdout.write(f"{label:>22}: {elapsed:6.2f}s | {changed} scores changed | "
+                          f"{answers / elapsed:,.0f} answers/s")
@@ -0,0 +1,168 @@
+import json
+import platform
+import random
+import statistics
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from cbt_app import question_index
+from cbt_app.models import Question
+from cbt_app.selection import pick_question
+from cbt_app.synthetic import generate_exam, parse_weights
+from cbt_app.views import _next_difficulty
+
+
+def legacy_pick(exam, exclude_ids, difficulty):
+    """The pre-blueprint selection: random choice over the whole unasked pool."""
+    base_qs = Question.objects.filter(exam=exam).exclude(id__in=exclude_ids)
+    pool = base_qs.filter(difficulty=difficulty)
+    if not pool.exists():
+        pool = base_qs
+    if not pool.exists():
+        return None
+    return random.choice(list(pool))
+
+
+def session_pick(exam, asked, difficulty):
+    """pick_question as the views call it: one session, progress kept on the index."""
+    return pick_question(exam, asked, difficulty, session_id=0)
+
+
+def _csv(cast):
+    return lambda value: [cast(v) for v in value.split(',')]
+
+
+class Command(BaseCommand):
+    help = (
+        "Micro-benchmark question selection on synthetic banks, without HTTP or auth. "
+        "Each bank is generated inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=_csv(int), default=[1000, 10000, 100000],
+                            help="Comma-separated bank sizes, e.g. 1000,100000,1000000.")
+        parser.add_argument('--progress', type=_csv(float), default=[0.0, 0.5, 0.95],
+                            help="Fractions of the bank already answered.")
+        parser.add_argument('--picks', type=int, default=50)
+        parser.add_argument('--difficulty', default='1:1:1')
+        parser.add_argument('--topics', type=int, default=8)
+        parser.add_argument('--topic-skew', type=float, default=0.0)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--legacy', action='store_true',
+                            help="Also time the old query-based pick (slow on large banks).")
+        parser.add_argument('--output', default=None, help="Write results as JSON here.")
+        parser.add_argument('--compare', default=None, help="Print deltas against a previous JSON file.")
+
+    def handle(self, *args, **opts):
+        try:
+            weights = parse_weights(opts['difficulty'], 3)
+        except ValueError as e:
+            raise CommandError(str(e))
+        pickers = [('blueprint', session_pick)]
+        if opts['legacy']:
+            pickers.append(('legacy', legacy_pick))
+
+        results = []
+        for size in opts['sizes']:
+            with transaction.atomic():
+                exam = generate_exam(size, weights, opts['topics'], opts['topic_skew'], opts['seed'])
+                results.extend(self._bench_bank(exam, size, pickers, opts))
+                transaction.set_rollback(True)
+            question_index.clear()
+
+        report = {
+            'meta': {
+                'created': timezone.now().isoformat(),
+                'python': platform.python_version(),
+                'database': connection.vendor,
+                'picks': opts['picks'],
+                'difficulty': opts['difficulty'],
+                'topics': opts['topics'],
+                'topic_skew': opts['topic_skew'],
+                'seed': opts['seed'],
+            },
+            'results': results,
+        }
+        if opts['output']:
+            with open(opts['output'], 'w') as fh:
+                json.dump(report, fh, indent=2)
+            self.stdout.write(f"wrote {opts['output']}")
+        if opts['compare']:
+            self._compare(opts['compare'], results)
+
+    def _bench_bank(self, exam, size, pickers, opts):
+        rng = random.Random(opts['seed'])
+        ids = list(Question.objects.filter(exam=exam).values_list('id', flat=True))
+
+        start = time.perf_counter()
+        question_index.build_index(exam)
+        build_ms = (time.perf_counter() - start) * 1000
+        tracemalloc.start()
+        index = question_index.build_index(exam)
+        _, index_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.stdout.write(f"{size} questions: index build {build_ms:.1f} ms, "
+                          f"peak {index_peak / 1024:.0f} KiB, {len(index.topics)} topics")
+
+        rows = []
+        for progress in opts['progress']:
+            start_asked = rng.sample(ids, int(len(ids) * progress))
+            for label, pick in pickers:
+                # each picker runs one session from the same point; picked ids count as asked
+                asked = list(start_asked)
+                index.progress.clear()
+                timings, queries = [], []
+                difficulty = 2
+                for _ in range(opts['picks']):
+                    with CaptureQueriesContext(connection) as ctx:
+                        start = time.perf_counter()
+                        q = pick(exam, asked, difficulty)
+                        timings.append((time.perf_counter() - start) * 1000)
+                    queries.append(len(ctx.captured_queries))
+                    if q is not None:
+                        asked.append(q.id)
+                    difficulty = _next_difficulty(difficulty, rng.random() < 0.5)
+                # the first pick of a session in a process builds its progress from the asked list
+                first_ms = timings[0]
+                timings = timings[1:] or timings
+                # separate pass: tracemalloc slows every allocation and would skew the timings
+                tracemalloc.start()
+                pick(exam, asked, difficulty)
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                timings.sort()
+                row = {
+                    'picker': label,
+                    'questions': size,
+                    'progress': progress,
+                    'mean_ms': round(statistics.mean(timings), 3),
+                    'p50_ms': round(timings[len(timings) // 2], 3),
+                    'p95_ms': round(timings[max(0, int(len(timings) * 0.95) - 1)], 3),
+                    'queries': round(statistics.mean(queries), 2),
+                    'peak_kib': round(peak / 1024, 1),
+                    'first_ms': round(first_ms, 3),
+                    'index_build_ms': round(build_ms, 1),
+                }
+                rows.append(row)
+                self.stdout.write(f"  {label:9} {progress:>5.0%} answered: first {row['first_ms']} ms | "
+                                  f"mean {row['mean_ms']} ms | "
+                                  f"p95 {row['p95_ms']} ms | {row['queries']} queries | "
+                                  f"peak {row['peak_kib']} KiB")
+        return rows
+
+    def _compare(self, path, results):
+        with open(path) as fh:
+            baseline = {(r['picker'], r['questions'], r['progress']): r for r in json.load(fh)['results']}
+        self.stdout.write(f"vs {path}:")
+        for row in results:
+            old = baseline.get((row['picker'], row['questions'], row['progress']))
+            if not old or not old['mean_ms']:
+                continue
+            change = (row['mean_ms'] - old['mean_ms']) / old['mean_ms'] * 100
+            self.stdout.write(f"  {row['picker']:9} {row['questions']:>8} @ {row['progress']:>5.0%}: "
+                              f"{old['mean_ms']} -> {row['mean_ms']} ms ({change:+.1f}%)")
@@ -0,0 +1,31 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cbt_app.exports import RENDERERS, session_rows
+
+
+class Command(BaseCommand):
+    help = "Stream exam session results as CSV or JSONL."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', dest='fmt', choices=sorted(RENDERERS), default='csv')
+        parser.add_argument('--exam', type=int, default=None, help="Only export this exam id.")
+        parser.add_argument('--output', default='-', help="File path, or '-' for stdout.")
+
+    def handle(self, *args, fmt, exam, output, **options):
+        render, _ = RENDERERS[fmt]
+        try:
+            out = sys.stdout if output == '-' else open(output, 'w', newline='', encoding='utf-8')
+        except OSError as e:
+            raise CommandError(str(e))
+        count = 0
+        try:
+            for chunk in render(session_rows(exam_id=exam)):
+                out.write(chunk)
+                count += 1
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        if out is not sys.stdout:
+            self.stderr.write(f"Wrote {count} lines to {output}")
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from cbt_app.synthetic import generate_exam, parse_weights
+
+
+class Command(BaseCommand):
+    help = "Create a synthetic exam with a generated question bank."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questions', type=int, default=10000)
+        parser.add_argument('--difficulty', default='1:1:1', help="Easy:Medium:Hard weights.")
+        parser.add_argument('--topics', type=int, default=8)
+        parser.add_argument('--topic-skew', type=float, default=0.0, help="0 = uniform, 1 = Zipf.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--name', default=None)
+
+    def handle(self, *args, questions, difficulty, topics, topic_skew, seed, name, **options):
+        try:
+            weights = parse_weights(difficulty, 3)
+        except ValueError as e:
+            raise CommandError(str(e))
+        exam = generate_exam(questions, weights, topics, topic_skew, seed, name)
+        self.stdout.write(f"Created exam {exam.id} '{exam.name}' with {questions} questions")
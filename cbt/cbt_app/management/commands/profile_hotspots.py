@@ -0,0 +1,45 @@
+import io
+import pstats
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from cbt_app.profiles import load_profiles
+
+
+class Command(BaseCommand):
+    help = "Aggregate the sampled request profiles and print the top hotspots."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default=None, help="Profile directory (default: PROFILER['DIR']).")
+        parser.add_argument('--route', default=None, help="Only profiles whose route contains this.")
+        parser.add_argument('--sort', default='cumulative', choices=['cumulative', 'tottime', 'ncalls'])
+        parser.add_argument('--limit', type=int, default=25)
+
+    def handle(self, *args, dir, route, sort, limit, **options):
+        directory = dir or getattr(settings, 'PROFILER', {}).get('DIR', 'profiles')
+        combined = None
+        report = io.StringIO()  # pstats prints piecewise; OutputWrapper would add newlines
+        per_route = defaultdict(lambda: {'n': 0, 'ms': 0.0, 'queries': 0})
+        for meta, profile in load_profiles(directory):
+            if route and route not in meta['route']:
+                continue
+            r = per_route[meta['route']]
+            r['n'] += 1
+            r['ms'] += meta['elapsed_ms']
+            r['queries'] += meta['queries']
+            if combined is None:
+                combined = pstats.Stats(profile, stream=report)
+            else:
+                combined.add(profile)
+
+        if combined is None:
+            self.stdout.write(f"No profiles found in {directory}")
+            return
+        for name, r in sorted(per_route.items(), key=lambda item: -item[1]['ms']):
+            self.stdout.write(f"{name}: {r['n']} profiles | mean {r['ms'] / r['n']:.1f} ms | "
+                              f"mean {r['queries'] / r['n']:.1f} queries")
+        self.stdout.write("")
+        combined.strip_dirs().sort_stats(sort).print_stats(limit)
+        self.stdout.write(report.getvalue())
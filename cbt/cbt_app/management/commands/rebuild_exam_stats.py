@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from cbt_app import stats
+from cbt_app.models import Exam
+
+
+class Command(BaseCommand):
+    help = "Recompute ExamStats / histograms from finished ExamSession rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--exam', type=int, default=None, help="Only rebuild this exam id.")
+
+    def handle(self, *args, exam, **options):
+        exam_ids = [exam] if exam is not None else Exam.objects.values_list('id', flat=True)
+        for exam_id in exam_ids:
+            result = stats.rebuild(exam_id)
+            self.stdout.write(f"exam {exam_id}: {result.attempts} finished attempts")
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from cbt_app.models import Question
+from cbt_app.rescoring import rescore
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute closed (finished or timed-out) sessions' scores against the current answer key, "
+        "for the given questions or every question of an exam. Each batch commits "
+        "on its own and re-running is a no-op, so the command can be stopped and re-run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--question', type=int, action='append', default=[], help="Repeatable.")
+        parser.add_argument('--exam', type=int, default=None, help="All questions of this exam.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help="Report the changes only.")
+        parser.add_argument('--show', type=int, default=10,
+                            help="Sessions to list per question in the dry-run report.")
+
+    def handle(self, *args, question, exam, batch_size, dry_run, show, **options):
+        ids = list(question)
+        if exam is not None:
+            ids += Question.objects.filter(exam_id=exam).values_list('id', flat=True)
+        if not ids:
+            raise CommandError("Pass --question and/or --exam.")
+
+        reports = rescore(ids, batch_size=batch_size, dry_run=dry_run, show=show)
+        for r in reports:
+            line = f"question {r['question_id']} (exam {r['exam_id']}): +1 for {r['gained']}, -1 for {r['lost']}"
+            if dry_run:
+                self.stdout.write(f"{line}, {r['unfinished_skipped']} in open sessions skipped "
+                                  f"[key: option {r['correct_option']}]")
+                for session_id, user_id, old, new in r['sample']:
+                    self.stdout.write(f"  session {session_id} (user {user_id}): {old} -> {new}")
+            else:
+                self.stdout.write(f"{line} in {r['batches']} batches, {r['seconds']:.2f}s")
+        changed = sum(r['gained'] + r['lost'] for r in reports)
+        verb = "would change" if dry_run else "changed"
+        self.stdout.write(f"done: {verb} {changed} session scores across {len(reports)} questions")
@@ -0,0 +1,111 @@
+import cProfile
+import hashlib
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+from . import db_routers, profiles
+
+WRITE_VERBS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+
+def _track_writes(execute, sql, params, many, context):
+    if sql.lstrip()[:7].upper().startswith(WRITE_VERBS):
+        db_routers.mark_write()
+    return execute(sql, params, many, context)
+
+
+def _client_key(request):
+    """Identify the client across requests: JWT header for the API, session cookie for pages."""
+    ident = request.META.get('HTTP_AUTHORIZATION') or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if not ident:
+        return None
+    return 'cbt:db_pin:' + hashlib.sha1(ident.encode()).hexdigest()
+
+
+class ReplicaStickinessMiddleware:
+    """
+    Read-your-writes for ReplicaRouter: after a request writes to default,
+    the same client reads from default for REPLICA_STICKY_SECONDS, which
+    covers replica lag. Pins live in the cache, so use a shared backend
+    when running several workers.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.USE_READ_REPLICA:
+            return self.get_response(request)
+        key = _client_key(request)
+        db_routers.reset(pinned=bool(key and cache.get(key)))
+        try:
+            with connections['default'].execute_wrapper(_track_writes):
+                response = self.get_response(request)
+            if key and db_routers.wrote():
+                cache.set(key, 1, settings.REPLICA_STICKY_SECONDS)
+        finally:
+            db_routers.reset()
+        return response
+
+
+def _profiler_settings():
+    return getattr(settings, 'PROFILER', {}) or {}
+
+
+class SamplingProfilerMiddleware:
+    """
+    Profile a sample of requests on selected routes with cProfile.
+    A request is kept if it was sampled (1 in SAMPLE_RATE) or took longer
+    than SLOW_MS. With SLOW_MS set every matching request runs under the
+    profiler, which is noticeably slower; leave it None for pure sampling.
+    Profiles go to DIR as gzip'd marshal files (see profiles.py), oldest
+    deleted beyond MAX_FILES.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        conf = _profiler_settings()
+        if not conf.get('ENABLED') or not request.path_info.startswith(tuple(conf.get('ROUTES', ()))):
+            return self.get_response(request)
+        sampled = random.random() * conf.get('SAMPLE_RATE', 1000) < 1
+        if not sampled and conf.get('SLOW_MS') is None:
+            return self.get_response(request)
+
+        queries = [0]
+
+        def count_queries(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        # every alias: replica reads and shard queries count too
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(count_queries))
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        slow_ms = conf.get('SLOW_MS')
+        if sampled or (slow_ms is not None and elapsed_ms >= slow_ms):
+            profiles.save_profile(profiler, conf, {
+                # URL pattern rather than path, so exams aggregate together
+                'route': getattr(request.resolver_match, 'route', None) or request.path_info,
+                'method': request.method,
+                'status': response.status_code,
+                'elapsed_ms': round(elapsed_ms, 2),
+                'queries': queries[0],
+                'sampled': sampled,
+            })
+        return response
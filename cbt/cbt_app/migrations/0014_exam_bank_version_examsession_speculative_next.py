@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cbt_app', '0013_alter_exam_duration_minutes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exam',
+            name='bank_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='examsession',
+            name='speculative_next',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:14
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cbt_app', '0014_exam_bank_version_examsession_speculative_next'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='exam',
+            name='name',
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+        migrations.AddIndex(
+            model_name='examsession',
+            index=models.Index(fields=['user', 'exam'], name='examsession_user_exam_idx'),
+        ),
+    ]
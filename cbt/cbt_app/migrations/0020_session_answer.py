@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cbt_app', '0019_examsession_shardable'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SessionAnswer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chosen_option', models.PositiveSmallIntegerField()),
+                ('is_correct', models.BooleanField()),
+                ('answered_at', models.DateTimeField(auto_now_add=True)),
+                ('exam', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='cbt_app.exam')),
+                ('question', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='cbt_app.question')),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='answers', to='cbt_app.examsession')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['question', 'session'], name='sessionanswer_question_idx')],
+                'constraints': [models.UniqueConstraint(fields=('session', 'question'), name='sessionanswer_unique')],
+            },
+        ),
+    ]
@@ -1,9 +1,15 @@
 from django.db import models
 from django.contrib.auth.models import User
 
+from . import sharding
+
 class Exam(models.Model):
-    name = models.CharField(max_length=100)
+    name = models.CharField(max_length=100, db_index=True)
     duration_minutes = models.PositiveIntegerField(default=120) 
+    # bumped whenever a question is saved/deleted (see signals.py)
+    bank_version = models.PositiveIntegerField(default=0)
+    # topic -> weight for balanced selection (see selection.py); empty = all topics equal
+    blueprint = models.JSONField(default=dict, blank=True)
     def __str__(self):
         return self.name
 
@@ -25,15 +31,27 @@ class Question(models.Model):
     def __str__(self):
         return self.text
 
+class ExamSessionQuerySet(models.QuerySet):
+    def for_exam(self, exam):
+        """This exam's sessions, on the database that holds them (see sharding.py)."""
+        exam_id = getattr(exam, 'pk', exam)
+        qs = self.filter(exam_id=exam_id)
+        # unsharded: leave the choice to the routers (reads may go to the replica)
+        return qs.using(sharding.shard_for_exam(exam_id)) if sharding.enabled() else qs
+
+
 class ExamSession(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
-    exam = models.ForeignKey(Exam, on_delete=models.CASCADE)
+    # no DB-level constraints: with sharding on, users/exams live in another database
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_constraint=False)
+    exam = models.ForeignKey(Exam, on_delete=models.CASCADE, db_constraint=False)
     asked_question_ids = models.JSONField(default=list, blank=True)
     current_difficulty = models.PositiveSmallIntegerField(default=2)
     correct_streak = models.PositiveSmallIntegerField(default=0)
     incorrect_streak = models.PositiveSmallIntegerField(default=0)
     adaptive = models.BooleanField(default=True)
     pending_question_id = models.IntegerField(null=True, blank=True) 
+    # follow-up question pre-selected for each outcome of the pending question
+    speculative_next = models.JSONField(null=True, blank=True)
     started_at = models.DateTimeField(null=True, blank=True)
     ends_at = models.DateTimeField(null=True, blank=True)
     finished_at = models.DateTimeField(null=True, blank=True)
@@ -41,4 +59,74 @@ class ExamSession(models.Model):
 
     # legacy count-based fields
     current_question = models.IntegerField(default=0)
-    score = models.IntegerField(default=0)
\ No newline at end of file
+    score = models.IntegerField(default=0)
+
+    objects = ExamSessionQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # every adaptive endpoint looks the session up by (user, exam)
+            models.Index(fields=['user', 'exam'], name='examsession_user_exam_idx'),
+        ]
+
+class SessionAnswer(models.Model):
+    """
+    One graded answer, kept so scores can be recomputed when a key is corrected
+    (see rescoring.py). Lives on its session's shard; exam/question are history,
+    not constraints, and the row goes away with its session.
+    """
+    session = models.ForeignKey(ExamSession, on_delete=models.CASCADE, related_name='answers')
+    exam = models.ForeignKey(Exam, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    question = models.ForeignKey(Question, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    chosen_option = models.PositiveSmallIntegerField()
+    # graded against the key at answer time (or at the last rescore)
+    is_correct = models.BooleanField()
+    answered_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['session', 'question'], name='sessionanswer_unique'),
+        ]
+        indexes = [
+            # rescoring walks one question's answers in session order
+            models.Index(fields=['question', 'session'], name='sessionanswer_question_idx'),
+        ]
+
+class ExamStats(models.Model):
+    """Running totals per exam, updated at finalize (see stats.py)."""
+    exam = models.OneToOneField(Exam, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    attempts = models.PositiveIntegerField(default=0)
+    score_sum = models.BigIntegerField(default=0)
+    timed_attempts = models.PositiveIntegerField(default=0)
+    finish_seconds_sum = models.BigIntegerField(default=0)
+
+class ExamStatsBucket(models.Model):
+    """One histogram bucket: number of finished sessions with this score / finish minute."""
+    SCORE = 'score'
+    FINISH_MINUTES = 'minutes'
+    KIND_CHOICES = ((SCORE, 'Score'), (FINISH_MINUTES, 'Minutes to finish'))
+
+    exam = models.ForeignKey(Exam, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    bucket = models.IntegerField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['exam', 'kind', 'bucket'], name='examstatsbucket_unique'),
+        ]
+
+
+class ArchivedExamSession(models.Model):
+    """
+    Compact copy of a long-finished ExamSession (see archive_sessions).
+    Keeps the original session id as primary key, so re-running a batch is a no-op.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    exam = models.ForeignKey(Exam, on_delete=models.CASCADE)
+    score = models.IntegerField(default=0)
+    answered_count = models.PositiveIntegerField(default=0)
+    final_difficulty = models.PositiveSmallIntegerField(default=2)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
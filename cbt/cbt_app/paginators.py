@@ -0,0 +1,46 @@
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max, Min, QuerySet
+from django.utils.functional import cached_property
+
+
+# Below this many rows an exact COUNT(*) is cheap enough to keep.
+EXACT_COUNT_LIMIT = 10000
+
+
+def estimate_rows(model, using='default'):
+    """
+    Cheap row-count estimate for a whole table, or None if unavailable.
+    PostgreSQL reads planner stats; SQLite uses MAX(pk) - MIN(pk) + 1,
+    two seeks on the primary-key index instead of a table scan. Archiving
+    deletes the oldest rows, which only raises MIN(pk); scattered deletes
+    still over-count, and shards need no id floor.
+    """
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT reltuples FROM pg_class WHERE relname = %s", [model._meta.db_table])
+            row = cursor.fetchone()
+        return int(row[0]) if row and row[0] >= 0 else None
+    rows = model._default_manager.using(using)
+    # separate queries: SQLite only optimizes a lone MIN() or MAX() into an index seek
+    high = rows.aggregate(n=Max('pk'))['n']
+    if high is None:
+        return 0
+    return high - rows.aggregate(n=Min('pk'))['n'] + 1
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that skips COUNT(*) on large unfiltered changelists.
+    Filtered querysets are still counted exactly.
+    """
+
+    @cached_property
+    def count(self):
+        qs = self.object_list
+        if isinstance(qs, QuerySet) and not qs.query.where:
+            estimate = estimate_rows(qs.model, using=qs.db)
+            if estimate is not None and estimate > EXACT_COUNT_LIMIT:
+                return estimate
+        return super().count
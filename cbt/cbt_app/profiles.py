@@ -0,0 +1,50 @@
+"""
+On-disk ring of sampled request profiles.
+Each file is gzip(marshal({'meta': {...}, 'stats': <cProfile stats>})),
+named <time_ns>-<route>.prof.gz so lexical order is age order.
+"""
+import gzip
+import marshal
+import re
+import time
+from pathlib import Path
+
+SUFFIX = '.prof.gz'
+
+
+class _LoadedProfile:
+    """Minimal stand-in for cProfile.Profile that pstats.Stats accepts."""
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+def save_profile(profiler, conf, meta):
+    directory = Path(conf.get('DIR', 'profiles'))
+    directory.mkdir(parents=True, exist_ok=True)
+    profiler.create_stats()
+    slug = re.sub(r'[^A-Za-z0-9]+', '_', meta['route']).strip('_')[:60]
+    path = directory / f'{time.time_ns()}-{slug}{SUFFIX}'
+    with gzip.open(path, 'wb') as fh:
+        fh.write(marshal.dumps({'meta': meta, 'stats': profiler.stats}))
+    _trim(directory, conf.get('MAX_FILES', 200))
+    return path
+
+
+def _trim(directory, max_files):
+    files = sorted(directory.glob('*' + SUFFIX))
+    for old in files[:max(0, len(files) - max_files)]:
+        old.unlink(missing_ok=True)
+
+
+def load_profiles(directory):
+    """Yield (meta, profile) for every file in the ring, oldest first."""
+    for path in sorted(Path(directory).glob('*' + SUFFIX)):
+        try:
+            with gzip.open(path, 'rb') as fh:
+                data = marshal.loads(fh.read())
+        except (OSError, EOFError, ValueError):
+            continue  # partially written or rotated away mid-read
+        yield data['meta'], _LoadedProfile(data['stats'])
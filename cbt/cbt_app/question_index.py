@@ -0,0 +1,136 @@
+"""
+Per-process index of each exam's question bank, keyed by Exam.bank_version
+so an edit anywhere (any worker) invalidates it on the next lookup.
+
+It doubles as the answer key used for grading. Grading looks the index up by
+exam id alone (get_index_for), so each answer only needs the bank version.
+With a shared cache (memcached, redis, ...) that comes from the cache, which
+signals.py clears on every question edit, so the next lookup anywhere sees it.
+A per-process cache can't be cleared in other workers, so there the version
+is read from the Exam row every time (one indexed single-column query).
+"""
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Exam, Question
+
+_indexes = {}
+
+# backends whose entries live in one process only
+LOCAL_CACHES = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+_cache_versions = False
+
+
+def configure():
+    """Cache bank versions only if the default cache is shared (AppConfig.ready)."""
+    global _cache_versions
+    _cache_versions = settings.CACHES['default']['BACKEND'] not in LOCAL_CACHES
+
+
+class ExamIndex:
+    """
+    ids / topic_codes / options / difficulties are parallel arrays sorted by id
+    (lookup by bisect); cells maps (topic, difficulty) -> array of question ids.
+    progress holds per-session selection state (selection.session_progress),
+    so it goes away with the index when the bank changes.
+    """
+    __slots__ = ('exam_id', 'version', 'ids', 'topic_codes', 'options', 'difficulties', 'topics', 'cells',
+                 'progress')
+
+    def __init__(self, exam_id, version):
+        self.exam_id = exam_id
+        self.version = version
+        self.ids = array('q')
+        self.topic_codes = array('H')
+        self.options = array('b')
+        self.difficulties = array('b')
+        self.topics = []
+        self.cells = {}
+        self.progress = OrderedDict()
+
+    @property
+    def total(self) -> int:
+        return len(self.ids)
+
+    def _position(self, question_id):
+        i = bisect_left(self.ids, question_id)
+        if i < len(self.ids) and self.ids[i] == question_id:
+            return i
+        return None
+
+    def topic_of(self, question_id):
+        i = self._position(question_id)
+        return None if i is None else self.topics[self.topic_codes[i]]
+
+    def answer(self, question_id):
+        """(correct_option, difficulty), or None if the question isn't in this exam."""
+        i = self._position(question_id)
+        return None if i is None else (self.options[i], self.difficulties[i])
+
+
+def _build(exam_id, version) -> ExamIndex:
+    index = ExamIndex(exam_id, version)
+    codes = {}
+    rows = Question.objects.filter(exam_id=exam_id).values_list(
+        'id', 'topic', 'difficulty', 'correct_option').order_by('id')
+    for qid, topic, difficulty, correct in rows.iterator(chunk_size=5000):
+        if topic not in codes:
+            codes[topic] = len(index.topics)
+            index.topics.append(topic)
+        index.ids.append(qid)
+        index.topic_codes.append(codes[topic])
+        index.options.append(correct)
+        index.difficulties.append(difficulty)
+        index.cells.setdefault((topic, difficulty), array('q')).append(qid)
+    _indexes[exam_id] = index
+    return index
+
+
+def build_index(exam) -> ExamIndex:
+    return _build(exam.id, exam.bank_version)
+
+
+def get_index(exam) -> ExamIndex:
+    index = _indexes.get(exam.id)
+    if index is None or index.version != exam.bank_version:
+        index = build_index(exam)
+    return index
+
+
+def _version_key(exam_id) -> str:
+    return f'cbt:bank_version:{exam_id}'
+
+
+def bank_version(exam_id) -> int:
+    """Exam.bank_version, via the cache if it is shared; raises Exam.DoesNotExist for unknown exams."""
+    version = cache.get(_version_key(exam_id)) if _cache_versions else None
+    if version is None:
+        version = Exam.objects.values_list('bank_version', flat=True).get(id=exam_id)
+        if _cache_versions:
+            cache.set(_version_key(exam_id), version, settings.BANK_VERSION_CACHE_SECONDS)
+    return version
+
+
+def forget_version(exam_id):
+    cache.delete(_version_key(exam_id))
+
+
+def get_index_for(exam_id) -> ExamIndex:
+    """Index for grading, without loading the Exam row (see bank_version)."""
+    version = bank_version(exam_id)
+    index = _indexes.get(exam_id)
+    # versions only grow, so an index built from a fresher Exam row is fine
+    if index is None or index.version < version:
+        index = _build(exam_id, version)
+    return index
+
+
+def clear():
+    _indexes.clear()
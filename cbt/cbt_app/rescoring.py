@@ -0,0 +1,138 @@
+"""
+Recomputing scores after an answer key is corrected.
+
+Every graded answer is stored as a SessionAnswer with the verdict it got
+(in live mode they are buffered with the session state and inserted when
+it is flushed, see live_state.py).
+Rescoring compares those verdicts with the key as it is now:
+  - answers marked wrong that the current key accepts give their session +1,
+  - answers marked right that the current key rejects give it -1,
+then the answers are re-marked. Everything is set-based UPDATEs over one
+question's answers, a batch of sessions per transaction, so a run can be
+interrupted and repeated safely: re-marked answers no longer differ.
+
+Only closed sessions are rescored: finalized ones, and ones whose timer has
+run out (a candidate who answers everything and closes the tab is never
+finalized, but can't answer anything more either). Open sessions still
+write their own score on every answer (possibly from the live-state cache),
+so their answers are left as they are and picked up by a run after they
+close. Archived sessions keep the score they were archived with.
+
+In live mode a timed-out session may still have state and answers in the
+cache; rescore_question writes them back and drops the entry first, or the
+answers would be missed and a later finalize would save the cached score
+over the rescored one. diff() only sees answers that have been flushed.
+"""
+import time
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import live_state, sharding, stats
+from .models import ExamSession, Question, SessionAnswer
+
+
+def record_answers(session: ExamSession, graded):
+    """Store (question_id, chosen_option, is_correct) rows for a session."""
+    if live_state.enabled():
+        live_state.add_answers(session, graded)
+        return
+    SessionAnswer.objects.using(session._state.db or 'default').bulk_create([
+        SessionAnswer(session_id=session.id, exam_id=session.exam_id, question_id=qid,
+                      chosen_option=chosen, is_correct=ok)
+        for qid, chosen, ok in graded
+    ], ignore_conflicts=True)  # a replayed answer keeps its first record
+
+
+def _answers(question):
+    return SessionAnswer.objects.using(sharding.shard_for_exam(question.exam_id)).filter(question_id=question.id)
+
+
+def _closed(cutoff=None):
+    return Q(session__is_finished=True) | Q(session__ends_at__lt=cutoff or timezone.now())
+
+
+def _changes(answers, key):
+    gained = answers.filter(is_correct=False, chosen_option=key)
+    lost = answers.filter(is_correct=True).exclude(chosen_option=key)
+    return gained, lost
+
+
+def diff(question, show=0) -> dict:
+    """What rescoring `question` would change, without writing anything."""
+    answers = _answers(question)
+    closed = _closed()
+    gained, lost = _changes(answers.filter(closed), question.correct_option)
+    pending_gained, pending_lost = _changes(answers.exclude(closed), question.correct_option)
+    report = {
+        'question_id': question.id,
+        'exam_id': question.exam_id,
+        'correct_option': question.correct_option,
+        'gained': gained.count(),
+        'lost': lost.count(),
+        'unfinished_skipped': pending_gained.count() + pending_lost.count(),
+        'sample': [],
+    }
+    if show:
+        for qs, delta in ((gained, 1), (lost, -1)):
+            for session_id, user_id, score in qs.values_list(
+                    'session_id', 'session__user_id', 'session__score')[:show]:
+                report['sample'].append((session_id, user_id, score, score + delta))
+    return report
+
+
+def rescore_question(question, batch_size=1000) -> dict:
+    """Apply the diff for one question in batches of `batch_size` answers."""
+    alias = sharding.shard_for_exam(question.exam_id)
+    # cutoff fixed once, so every batch sees the same set of closed sessions
+    cutoff = timezone.now()
+    finished = _answers(question).filter(_closed(cutoff))
+    sessions = ExamSession.objects.using(alias)
+    if live_state.enabled():
+        live_state.retire(sessions.filter(
+            exam_id=question.exam_id, is_finished=False, ends_at__lt=cutoff).values_list('id', flat=True))
+    result = {'question_id': question.id, 'exam_id': question.exam_id, 'gained': 0, 'lost': 0, 'batches': 0}
+    last = 0
+    while True:
+        # keyset batching on the (question, session) index
+        bounds = list(
+            finished.filter(session_id__gt=last).order_by('session_id')
+            .values_list('session_id', flat=True)[batch_size - 1:batch_size]
+        )
+        window = finished.filter(session_id__gt=last)
+        if bounds:
+            window = window.filter(session_id__lte=bounds[0])
+        gained, lost = _changes(window, question.correct_option)
+        with transaction.atomic(using=alias):
+            result['gained'] += sessions.filter(id__in=gained.values('session_id')).update(score=F('score') + 1)
+            result['lost'] += sessions.filter(id__in=lost.values('session_id')).update(score=F('score') - 1)
+            gained.update(is_correct=True)
+            lost.update(is_correct=False)
+        result['batches'] += 1
+        if not bounds:
+            return result
+        last = bounds[0]
+
+
+def rescore(question_ids, batch_size=1000, dry_run=False, show=0) -> list:
+    """
+    Rescore closed sessions for each question against its current key.
+    Rebuilds the stats of every exam whose scores changed. Returns one
+    report dict per question (diff() output when dry_run).
+    """
+    questions = Question.objects.filter(id__in=list(question_ids)).order_by('id')
+    if dry_run:
+        return [diff(q, show=show) for q in questions]
+    reports = []
+    changed_exams = set()
+    for q in questions:
+        start = time.perf_counter()
+        report = rescore_question(q, batch_size=batch_size)
+        report['seconds'] = time.perf_counter() - start
+        if report['gained'] or report['lost']:
+            changed_exams.add(q.exam_id)
+        reports.append(report)
+    for exam_id in changed_exams:
+        stats.rebuild(exam_id)
+    return reports
@@ -0,0 +1,130 @@
+"""
+Blueprint-driven question selection over the precomputed question index.
+
+Exam.blueprint maps topic -> weight (empty = all topics weighted equally).
+The next question comes from the weighted topic that is furthest behind its
+share (asked / weight), at the requested difficulty if any such topic has
+one left, else at the nearest difficulty. Topics outside the blueprint are
+only used once the weighted ones are exhausted.
+
+A pick needs the asked ids as a set and the asked count per topic. For a
+session those are kept on the exam's index (session_progress) and extended
+with only the ids asked since the last pick, so a pick costs O(topics), not
+O(asked) or O(bank size); the first pick for a session in a process, or
+after a bank edit, builds them once.
+"""
+import random
+import threading
+from collections import Counter
+
+from . import question_index
+from .models import Question
+
+DIFFICULTIES = (1, 2, 3)
+MAX_PROBES = 8
+MAX_TRACKED_SESSIONS = 10000
+
+
+class Progress:
+    """
+    The ids a session was asked, as a set, plus how many per topic.
+    `size`/`last` describe the asked list it was built from, so it can be
+    extended when the list grows and rebuilt if it changed any other way.
+    """
+    __slots__ = ('asked', 'counts', 'size', 'last')
+
+    def __init__(self):
+        self.asked = set()
+        self.counts = Counter()
+        self.size = 0
+        self.last = None
+
+    def matches(self, asked_ids) -> bool:
+        return self.size <= len(asked_ids) and (self.size == 0 or asked_ids[self.size - 1] == self.last)
+
+    def extend(self, index, asked_ids):
+        for qid in asked_ids[self.size:]:
+            if qid not in self.asked:
+                self.asked.add(qid)
+                self.counts[index.topic_of(qid)] += 1
+        self.size = len(asked_ids)
+        self.last = asked_ids[-1] if asked_ids else None
+        return self
+
+
+_lock = threading.Lock()
+
+
+def session_progress(index, session_id, asked_ids) -> Progress:
+    """The session's Progress against `index`, extended with ids asked since the last call."""
+    with _lock:
+        # index.progress: session_id -> Progress, least recently used first
+        progress = index.progress.pop(session_id, None)
+        if progress is None or not progress.matches(asked_ids):
+            progress = Progress()
+        progress.extend(index, asked_ids)
+        index.progress[session_id] = progress
+        if len(index.progress) > MAX_TRACKED_SESSIONS:
+            index.progress.popitem(last=False)
+    return progress
+
+
+def _sample_unasked(ids, asked, extra):
+    """Random id from `ids` in neither `asked` nor `extra`; O(1) expected while few are asked."""
+    if not ids:
+        return None
+    for _ in range(MAX_PROBES):
+        qid = ids[random.randrange(len(ids))]
+        if qid not in asked and qid not in extra:
+            return qid
+    remaining = [qid for qid in ids if qid not in asked and qid not in extra]
+    return random.choice(remaining) if remaining else None
+
+
+def _topic_groups(index, blueprint, progress, extra):
+    weights = blueprint or {t: 1 for t in index.topics}
+    counts = progress.counts + Counter(index.topic_of(qid) for qid in extra)
+    weighted = [t for t in index.topics if weights.get(t, 0) > 0]
+    weighted.sort(key=lambda t: (counts[t] / weights[t], random.random()))
+    rest = [t for t in index.topics if weights.get(t, 0) <= 0]
+    random.shuffle(rest)
+    return weighted, rest
+
+
+def pick_question_id(index, blueprint, exclude_ids, difficulty, progress=None):
+    """
+    Id of the next question, from the index alone (no queries), or None.
+    With `progress` (see session_progress), `exclude_ids` only needs the
+    ids beyond it, e.g. the question being served.
+    """
+    if progress is None:
+        progress, extra = Progress().extend(index, list(exclude_ids)), set()
+    else:
+        extra = set(exclude_ids) - progress.asked
+    by_nearness = sorted(DIFFICULTIES, key=lambda d: (abs(d - difficulty), d))
+    for topics in _topic_groups(index, blueprint, progress, extra):
+        for d in by_nearness:
+            for topic in topics:
+                qid = _sample_unasked(index.cells.get((topic, d)), progress.asked, extra)
+                if qid is not None:
+                    return qid
+    return None
+
+
+def pick_question(exam, exclude_ids, difficulty: int, session_id=None):
+    """
+    Next unasked Question for `exam` at (or nearest to) `difficulty`, or None.
+    Pass the session's id with its asked list to reuse its Progress.
+    """
+    index = question_index.get_index(exam)
+    progress = session_progress(index, session_id, exclude_ids) if session_id is not None else None
+    qid = pick_question_id(index, exam.blueprint, () if progress is not None else exclude_ids, difficulty, progress)
+    if qid is None:
+        return None
+    q = Question.objects.filter(id=qid).first()
+    if q is None:
+        # deleted since the index was built without a version bump; rebuild once
+        index = question_index.build_index(exam)
+        qid = pick_question_id(index, exam.blueprint, exclude_ids, difficulty)
+        q = Question.objects.filter(id=qid).first() if qid is not None else None
+    return q
@@ -0,0 +1,104 @@
+"""
+Optional per-exam sharding of session data across several databases.
+
+SESSION_SHARDS lists database aliases. An exam's sessions live on
+SESSION_SHARD_MAP[exam_id] if it is pinned there, else on
+SESSION_SHARDS[exam_id % len(SESSION_SHARDS)]; empty = everything on default.
+Only the models in SHARDED_MODELS move; users, exams and questions stay on
+default, so sharded rows have no database-level foreign keys and queries on
+a shard can't join to them (resolve names on default instead).
+
+Each shard hands out primary keys from its own range (shard index * ID_SPAN,
+see reserve_id_range), so ids stay unique across shards, which live_state
+cache keys and the archive rely on, and the owning shard can be found from
+an id alone (shard_for_id).
+
+Code that knows the exam goes through ExamSession.objects.for_exam(); code
+that scans every exam uses the cross-shard helpers below.
+"""
+from django.conf import settings
+from django.db import connections
+
+ID_SPAN = 10 ** 12
+
+# label_lower of every model whose rows follow the exam's shard
+SHARDED_MODELS = {'cbt_app.examsession', 'cbt_app.sessionanswer'}
+
+
+def enabled() -> bool:
+    return bool(getattr(settings, 'SESSION_SHARDS', None))
+
+
+def aliases():
+    return list(settings.SESSION_SHARDS) if enabled() else ['default']
+
+
+def is_sharded(model) -> bool:
+    return model._meta.label_lower in SHARDED_MODELS
+
+
+def shard_for_exam(exam_id) -> str:
+    if not enabled():
+        return 'default'
+    pinned = getattr(settings, 'SESSION_SHARD_MAP', {}).get(exam_id)
+    return pinned or settings.SESSION_SHARDS[exam_id % len(settings.SESSION_SHARDS)]
+
+
+def shard_for_id(pk) -> str:
+    shards = aliases()
+    index = int(pk) // ID_SPAN
+    return shards[index] if index < len(shards) else 'default'
+
+
+def id_floor(using) -> int:
+    """First primary key handed out on `using` (0 outside the shard list)."""
+    shards = aliases()
+    return shards.index(using) * ID_SPAN if using in shards else 0
+
+
+# --- cross-shard helpers ---------------------------------------------------
+
+def across(queryset):
+    """The queryset once per shard, in shard order (which is also id order)."""
+    for alias in aliases():
+        yield queryset.using(alias)
+
+
+def count(queryset) -> int:
+    return sum(qs.count() for qs in across(queryset))
+
+
+def iterate(queryset, chunk_size=2000):
+    """Stream rows from every shard; pass an order_by('id') queryset for global id order."""
+    for qs in across(queryset):
+        yield from qs.iterator(chunk_size=chunk_size)
+
+
+def distinct_values(queryset, field) -> set:
+    values = set()
+    for qs in across(queryset):
+        values.update(qs.values_list(field, flat=True).distinct())
+    return values
+
+
+def reserve_id_range(using, models):
+    """
+    Start `using`'s autoincrement counters at its id floor (post_migrate hook).
+    SQLite only; on other backends set each table's identity start by hand.
+    """
+    floor = id_floor(using)
+    connection = connections[using]
+    if not floor or connection.vendor != 'sqlite':
+        return
+    tables = set(connection.introspection.table_names())
+    with connection.cursor() as cursor:
+        for model in models:
+            table = model._meta.db_table
+            if not is_sharded(model) or table not in tables:
+                continue
+            cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = %s", [table])
+            row = cursor.fetchone()
+            if row is None:
+                cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)", [table, floor])
+            elif row[0] < floor:
+                cursor.execute("UPDATE sqlite_sequence SET seq = %s WHERE name = %s", [floor, table])
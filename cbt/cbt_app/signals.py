@@ -0,0 +1,32 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import question_index, sharding
+from .models import Exam, ExamSession, Question
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def bump_bank_version(sender, instance, **kwargs):
+    """
+    Invalidate anything derived from the exam's question bank.
+    Note: QuerySet.update()/bulk_create() bypass signals; bump manually there.
+    """
+    Exam.objects.filter(id=instance.exam_id).update(bank_version=F('bank_version') + 1)
+    # after commit, so no one re-caches the old version from a still-uncommitted row
+    transaction.on_commit(lambda: question_index.forget_version(instance.exam_id))
+
+
+@receiver(post_delete, sender=Exam)
+@receiver(post_delete, sender=User)
+def delete_sharded_sessions(sender, instance, **kwargs):
+    """The delete cascade only reaches default; clear sessions held on other shards."""
+    if not sharding.enabled():
+        return
+    field = 'exam_id' if sender is Exam else 'user_id'
+    for alias in sharding.aliases():
+        if alias != 'default':
+            ExamSession.objects.using(alias).filter(**{field: instance.pk}).delete()
@@ -0,0 +1,106 @@
+"""
+Incremental per-exam statistics. Every counter is bumped with an F()
+update, so concurrent finalizes never lose increments. Scores changed
+after finalize (save_exam_result) are not tracked; rebuild_exam_stats
+recomputes everything from ExamSession and the archive.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .archive import finished_score_rows
+from .models import ExamSession, ExamStats, ExamStatsBucket
+
+
+def _finish_seconds(session):
+    if not session.started_at or not session.finished_at:
+        return None
+    return max(0, int((session.finished_at - session.started_at).total_seconds()))
+
+
+def _bump(exam_id, kind, bucket, by=1):
+    updated = ExamStatsBucket.objects.filter(exam_id=exam_id, kind=kind, bucket=bucket).update(count=F('count') + by)
+    if updated:
+        return
+    try:
+        with transaction.atomic():
+            ExamStatsBucket.objects.create(exam_id=exam_id, kind=kind, bucket=bucket, count=by)
+    except IntegrityError:
+        # another finalize created it first
+        ExamStatsBucket.objects.filter(exam_id=exam_id, kind=kind, bucket=bucket).update(count=F('count') + by)
+
+
+def record_finished(session: ExamSession):
+    seconds = _finish_seconds(session)
+    with transaction.atomic():
+        ExamStats.objects.get_or_create(exam_id=session.exam_id)
+        totals = {'attempts': F('attempts') + 1, 'score_sum': F('score_sum') + session.score}
+        if seconds is not None:
+            totals['timed_attempts'] = F('timed_attempts') + 1
+            totals['finish_seconds_sum'] = F('finish_seconds_sum') + seconds
+        ExamStats.objects.filter(exam_id=session.exam_id).update(**totals)
+        _bump(session.exam_id, ExamStatsBucket.SCORE, session.score)
+        if seconds is not None:
+            _bump(session.exam_id, ExamStatsBucket.FINISH_MINUTES, seconds // 60)
+
+
+def histogram(exam_id, kind) -> list:
+    return list(
+        ExamStatsBucket.objects.filter(exam_id=exam_id, kind=kind)
+        .order_by('bucket').values_list('bucket', 'count')
+    )
+
+
+def percentile(exam_id, score):
+    """
+    Share of finished attempts scoring below `score` (ties count half), 0-100.
+    Reads only the score histogram: O(distinct scores), not O(sessions).
+    """
+    below = equal = total = 0
+    for bucket, count in histogram(exam_id, ExamStatsBucket.SCORE):
+        total += count
+        if bucket < score:
+            below += count
+        elif bucket == score:
+            equal += count
+    if not total:
+        return None
+    return round(100.0 * (below + 0.5 * equal) / total, 1)
+
+
+def summary(exam_id) -> dict:
+    stats = ExamStats.objects.filter(exam_id=exam_id).first()
+    if stats is None or not stats.attempts:
+        return {"attempts": 0, "mean_score": None, "mean_finish_seconds": None}
+    return {
+        "attempts": stats.attempts,
+        "mean_score": round(stats.score_sum / stats.attempts, 2),
+        "mean_finish_seconds": (
+            round(stats.finish_seconds_sum / stats.timed_attempts) if stats.timed_attempts else None
+        ),
+    }
+
+
+def rebuild(exam_id):
+    """Recompute one exam's stats from its finished sessions, archived ones included."""
+    stats = ExamStats(exam_id=exam_id)
+    buckets = {}
+    for score, started_at, finished_at in finished_score_rows(exam_id):
+        stats.attempts += 1
+        stats.score_sum += score
+        key = (ExamStatsBucket.SCORE, score)
+        buckets[key] = buckets.get(key, 0) + 1
+        if started_at and finished_at:
+            seconds = max(0, int((finished_at - started_at).total_seconds()))
+            stats.timed_attempts += 1
+            stats.finish_seconds_sum += seconds
+            key = (ExamStatsBucket.FINISH_MINUTES, seconds // 60)
+            buckets[key] = buckets.get(key, 0) + 1
+    with transaction.atomic():
+        ExamStats.objects.filter(exam_id=exam_id).delete()
+        ExamStatsBucket.objects.filter(exam_id=exam_id).delete()
+        stats.save()
+        ExamStatsBucket.objects.bulk_create([
+            ExamStatsBucket(exam_id=exam_id, kind=kind, bucket=bucket, count=n)
+            for (kind, bucket), n in buckets.items()
+        ], batch_size=1000)
+    return stats
@@ -0,0 +1,46 @@
+"""
+Synthetic question banks for benchmarks. Deterministic for a given seed.
+"""
+import random
+
+from .models import Exam, Question
+
+BATCH_SIZE = 5000
+
+
+def parse_weights(spec, n):
+    """'1:2:1' -> [1.0, 2.0, 1.0]; must have exactly n parts."""
+    weights = [float(w) for w in spec.split(':')]
+    if len(weights) != n or any(w < 0 for w in weights) or not sum(weights):
+        raise ValueError(f"Expected {n} non-negative weights like 1:2:1, got '{spec}'.")
+    return weights
+
+
+def topic_weights(topics, skew):
+    """Zipf-like topic popularity: weight of the k-th topic is 1 / k**skew (0 = uniform)."""
+    return [1 / (k ** skew) for k in range(1, topics + 1)]
+
+
+def generate_exam(questions, difficulty_weights=(1, 1, 1), topics=8, topic_skew=0.0,
+                  seed=0, name=None, duration_minutes=120) -> Exam:
+    rng = random.Random(seed)
+    exam = Exam.objects.create(
+        name=name or f'synthetic-{questions}', duration_minutes=duration_minutes,
+    )
+    topic_names = [f'topic{k}' for k in range(topics)]
+    t_weights = topic_weights(topics, topic_skew)
+    batch = []
+    for i in range(questions):
+        batch.append(Question(
+            exam=exam, text=f'Synthetic question {i}',
+            option1='A', option2='B', option3='C', option4='D',
+            correct_option=rng.randint(1, 4),
+            difficulty=rng.choices((1, 2, 3), weights=difficulty_weights)[0],
+            topic=rng.choices(topic_names, weights=t_weights)[0],
+        ))
+        if len(batch) >= BATCH_SIZE:
+            Question.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        Question.objects.bulk_create(batch)
+    return exam
@@ -1,3 +1,894 @@
-from django.test import TestCase
+import asyncio
+import cProfile
+import json
+import tempfile
+from collections import Counter
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection, connections
+from django.db.models import F
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import db_routers, live_state, profiles, question_index, rescoring, sharding, stats, warmup
+from .exports import EXPORT_FIELDS, session_rows
+from .middleware import ReplicaStickinessMiddleware, SamplingProfilerMiddleware
+from .models import ArchivedExamSession, Exam, Question, ExamSession, ExamStatsBucket, SessionAnswer
+from .paginators import estimate_rows
+from .selection import pick_question, session_progress
+from .views import SPECULATION_DEPTH
+
+
+class AdminChangelistQueryTests(TestCase):
+    """Changelist pages must not issue per-row queries for user/exam."""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', password='pass')
+        self.client.force_login(self.admin)
+        self.exam = Exam.objects.create(name='Physics')
+
+    def _changelist_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def _add_sessions(self, n):
+        for i in range(n):
+            user = User.objects.create_user(f'candidate{ExamSession.objects.count()}')
+            ExamSession.objects.create(user=user, exam=self.exam, score=i)
+
+    def _add_questions(self, n):
+        Question.objects.bulk_create([
+            Question(exam=self.exam, text=f'Q{i}', option1='a', option2='b',
+                     option3='c', option4='d', correct_option=1)
+            for i in range(n)
+        ])
+
+    def test_examsession_changelist_query_count_is_bounded(self):
+        url = '/admin/cbt_app/examsession/'
+        self._add_sessions(3)
+        few = self._changelist_queries(url)
+        self._add_sessions(40)
+        many = self._changelist_queries(url)
+        self.assertEqual(few, many)
+        self.assertLessEqual(many, 10)
+
+    def test_examsession_changelist_username_filter(self):
+        self._add_sessions(3)
+        response = self.client.get('/admin/cbt_app/examsession/', {'username': 'candidate1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cl'].result_count, 1)
+
+    def test_examsession_search_resolves_ids_without_like(self):
+        self._add_sessions(3)
+        ExamSession.objects.create(user=User.objects.create_user('other'),
+                                   exam=Exam.objects.create(name='Physical education'))
+        for term, expected in (('candidate1', 1), ('Phys', 4), ('Physical', 1), ('phys', 0), ('cand', 0)):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get('/admin/cbt_app/examsession/', {'q': term})
+            self.assertEqual(response.context['cl'].result_count, expected, term)
+            self.assertFalse(any(' LIKE ' in q['sql'] for q in ctx.captured_queries), term)
+
+    def test_question_changelist_query_count_is_bounded(self):
+        url = '/admin/cbt_app/question/'
+        self._add_questions(3)
+        few = self._changelist_queries(url)
+        self._add_questions(40)
+        many = self._changelist_queries(url)
+        self.assertEqual(few, many)
+        self.assertLessEqual(many, 10)
+
+
+class EstimatedCountTests(TestCase):
+    def test_estimate_ignores_archived_id_range(self):
+        exam = Exam.objects.create(name='Latin')
+        user = User.objects.create_user('candidate', password='pass')
+        ExamSession.objects.bulk_create([ExamSession(user=user, exam=exam) for _ in range(10)])
+        oldest = ExamSession.objects.order_by('id').values_list('id', flat=True)[:6]
+        ExamSession.objects.filter(id__in=list(oldest)).delete()
+        self.assertEqual(estimate_rows(ExamSession), 4)
+        ExamSession.objects.all().delete()
+        self.assertEqual(estimate_rows(ExamSession), 0)
+
+
+@override_settings(USE_READ_REPLICA=True, REPLICA_STICKY_SECONDS=10)
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = db_routers.ReplicaRouter()
+        db_routers.reset()
+        cache.clear()
+
+    def tearDown(self):
+        db_routers.reset()
+
+    def test_read_only_views_read_replica_until_a_write(self):
+        seen = []
+
+        @db_routers.replica_reads
+        def view():
+            seen.append(self.router.db_for_read(ExamSession))
+            db_routers.mark_write()
+            seen.append(self.router.db_for_read(ExamSession))
+
+        view()
+        self.assertEqual(seen, ['replica', 'default'])
+        self.assertEqual(self.router.db_for_write(ExamSession), 'default')
+
+    def test_other_reads_go_to_default(self):
+        # read-modify-write views must not start from a lagging replica row
+        self.assertEqual(self.router.db_for_read(ExamSession), 'default')
+        rows = db_routers.iter_replica_reads(self.router.db_for_read(ExamSession) for _ in range(2))
+        self.assertEqual(list(rows), ['replica', 'replica'])
+        self.assertEqual(self.router.db_for_read(ExamSession), 'default')
+
+    @override_settings(USE_READ_REPLICA=False)
+    def test_disabled_reads_go_to_default(self):
+        self.assertEqual(self.router.db_for_read(ExamSession), 'default')
+
+    def test_client_is_pinned_after_a_write(self):
+        seen = []
+
+        @db_routers.replica_reads
+        def view(request):
+            seen.append(self.router.db_for_read(ExamSession))
+            if request.method == 'POST':
+                db_routers.mark_write()
+            return HttpResponse()
+
+        middleware = ReplicaStickinessMiddleware(view)
+        factory = RequestFactory()
+        middleware(factory.get('/', HTTP_AUTHORIZATION='Bearer a'))
+        middleware(factory.post('/', HTTP_AUTHORIZATION='Bearer a'))
+        middleware(factory.get('/', HTTP_AUTHORIZATION='Bearer a'))
+        middleware(factory.get('/', HTTP_AUTHORIZATION='Bearer b'))
+        self.assertEqual(seen, ['replica', 'replica', 'default', 'replica'])
+
+
+@override_settings(SESSION_SHARDS=['default', 'shard1', 'shard2'], SESSION_SHARD_MAP={5: 'default'})
+class ShardRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = db_routers.ShardRouter()
+
+    def test_exam_maps_to_shard_unless_pinned(self):
+        self.assertEqual(sharding.shard_for_exam(4), 'shard1')
+        self.assertEqual(sharding.shard_for_exam(5), 'default')
+        self.assertEqual(sharding.shard_for_id(2 * sharding.ID_SPAN + 7), 'shard2')
+        self.assertEqual(sharding.shard_for_id(7), 'default')
+
+    def test_instances_route_to_their_shard(self):
+        self.assertEqual(self.router.db_for_write(ExamSession, instance=ExamSession(exam_id=4)), 'shard1')
+        self.assertEqual(self.router.db_for_read(ExamSession, instance=Exam(id=8)), 'shard2')
+        self.assertIsNone(self.router.db_for_read(ExamSession))
+        self.assertIsNone(self.router.db_for_write(Exam, instance=Exam(id=4)))
+
+    def test_shards_only_migrate_sharded_models(self):
+        self.assertTrue(self.router.allow_migrate('shard1', 'cbt_app', 'examsession'))
+        self.assertFalse(self.router.allow_migrate('shard1', 'cbt_app', 'question'))
+        self.assertFalse(self.router.allow_migrate('shard1', 'auth', 'user'))
+        self.assertIsNone(self.router.allow_migrate('default', 'cbt_app', 'question'))
+
+    @override_settings(SESSION_SHARDS=[])
+    def test_disabled_defers_to_next_router(self):
+        self.assertEqual(sharding.shard_for_exam(4), 'default')
+        self.assertIsNone(self.router.db_for_write(ExamSession, instance=ExamSession(exam_id=4)))
+
+
+@override_settings(LIVE_SESSION_STATE=True, LIVE_SESSION_FLUSH_SECONDS=3600)
+class LiveSessionStateTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        live_state._dirty.clear()
+        question_index.clear()
+        self.user = User.objects.create_user('candidate', password='pass')
+        self.exam = Exam.objects.create(name='Maths')
+        Question.objects.bulk_create([
+            Question(exam=self.exam, text=f'Q{i}', option1='a', option2='b',
+                     option3='c', option4='d', correct_option=1, difficulty=i % 3 + 1)
+            for i in range(6)
+        ])
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _answer(self, answer=1):
+        q = self.client.get(f'/api/adaptive/next/{self.exam.id}/').json()['question']
+        return self.client.post('/api/adaptive/check_answer/', {
+            'exam_id': self.exam.id, 'question_id': q['id'], 'answer': answer,
+        }, format='json').json()
+
+    def _row(self):
+        return ExamSession.objects.get(user=self.user, exam=self.exam)
+
+    def _status(self):
+        return self.client.get(f'/api/adaptive/status/{self.exam.id}/').json()
+
+    def test_answers_stay_in_cache_until_flush(self):
+        self._answer()
+        self._answer()
+        self.assertEqual(self._row().score, 0)
+        self.assertEqual(self._row().asked_question_ids, [])
+        self.assertEqual(self._status()['asked_count'], 3)  # 2 answered + pending
+        self.assertEqual(SessionAnswer.objects.count(), 0)
+
+        self.assertEqual(live_state.flush(), 1)
+        row = self._row()
+        self.assertEqual(row.score, 2)
+        self.assertEqual(len(row.asked_question_ids), 2)
+        self.assertEqual(SessionAnswer.objects.filter(session=row, is_correct=True).count(), 2)
+
+    @mock.patch.object(live_state, '_start_flusher')
+    def test_requests_never_flush_inline(self, start_flusher):
+        with override_settings(LIVE_SESSION_FLUSH_SECONDS=0):
+            self._answer()
+        self.assertEqual(self._row().score, 0)
+        start_flusher.assert_called()
+
+    @mock.patch.object(live_state.threading, 'Thread')
+    def test_flusher_starts_once_per_process(self, thread):
+        with mock.patch.object(live_state, '_flusher_pid', None):
+            live_state._start_flusher()
+            live_state._start_flusher()
+            self.assertEqual(thread.call_count, 1)
+            with mock.patch.object(live_state.os, 'getpid', return_value=-1):  # forked worker
+                live_state._start_flusher()
+            self.assertEqual(thread.call_count, 2)
+
+    def test_background_thread_flushes_every_interval(self):
+        # sleep -> flush, twice, then stop the loop
+        with mock.patch.object(live_state.time, 'sleep', side_effect=[None, None, SystemExit]) as sleep, \
+                mock.patch.object(live_state, 'flush', side_effect=[1, DatabaseError('locked')]) as flush, \
+                mock.patch.object(live_state.connections, 'close_all'), \
+                self.assertLogs('cbt_app.live_state', 'ERROR'):
+            with self.assertRaises(SystemExit):
+                live_state._flush_loop()
+        self.assertEqual(flush.call_count, 2)  # a failed flush doesn't stop the thread
+        sleep.assert_called_with(3600)
+
+    def test_crash_falls_back_to_last_flushed_state(self):
+        self._answer()
+        live_state.flush()
+        self._answer()
+        # process dies before the next flush; its local cache goes with it
+        cache.clear()
+        live_state._dirty.clear()
+        status = self._status()
+        self.assertEqual(status['asked_count'], 2)  # 1 flushed answer + pending
+        self.assertEqual(self._row().score, 1)
+        self.assertEqual(SessionAnswer.objects.count(), 1)  # the lost answer left no row
+
+    def test_finalize_writes_live_state(self):
+        self._answer()
+        self._answer(answer=2)
+        self.client.post(f'/api/adaptive/finalize/{self.exam.id}/')
+        row = self._row()
+        self.assertTrue(row.is_finished)
+        self.assertEqual(row.score, 1)
+        self.assertEqual(row.current_question, 2)
+        self.assertIsNone(cache.get(live_state._key(row.id)))
+        self.assertEqual(SessionAnswer.objects.filter(session=row).count(), 2)
+
+
+class TokenBucketThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('candidate', password='pass')
+        self.exam = Exam.objects.create(name='Maths')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    @override_settings(REST_FRAMEWORK={'DEFAULT_THROTTLE_RATES': {'adaptive_status': '3/min'}})
+    def test_status_is_throttled_per_user_with_retry_after(self):
+        url = f'/api/adaptive/status/{self.exam.id}/'
+        codes = [self.client.get(url).status_code for _ in range(4)]
+        self.assertEqual(codes, [200, 200, 200, 429])
+        self.assertEqual(self.client.get(url)['Retry-After'], '20')
+
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user('other', password='pass'))
+        self.assertEqual(other.get(url).status_code, 200)
+
+
+class IdempotentAnswerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        question_index.clear()
+        self.user = User.objects.create_user('candidate', password='pass')
+        self.exam = Exam.objects.create(name='Maths')
+        Question.objects.bulk_create([
+            Question(exam=self.exam, text=f'Q{i}', option1='a', option2='b',
+                     option3='c', option4='d', correct_option=1)
+            for i in range(3)
+        ])
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_duplicate_answer_is_replayed_without_rescoring(self):
+        q = self.client.get(f'/api/adaptive/next/{self.exam.id}/').json()['question']
+        payload = {'exam_id': self.exam.id, 'question_id': q['id'], 'answer': 1}
+        first = self.client.post('/api/adaptive/check_answer/', payload, format='json')
+        with self.assertNumQueries(0):
+            retry = self.client.post('/api/adaptive/check_answer/', payload, format='json')
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(ExamSession.objects.get(user=self.user).score, 1)
+
+    def test_idempotency_key_header_takes_precedence(self):
+        url = f'/api/save_result/{self.exam.id}/'
+        payload = {'score': 2, 'total_questions': 3}
+        self.client.post(url, payload, format='json', HTTP_IDEMPOTENCY_KEY='k1')
+        retry = self.client.post(url, payload, format='json', HTTP_IDEMPOTENCY_KEY='k1')
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(ExamSession.objects.get(user=self.user).score, 2)
+
+    def test_reused_key_with_different_body_rejected(self):
+        url = f'/api/save_result/{self.exam.id}/'
+        self.client.post(url, {'score': 2, 'total_questions': 3}, format='json', HTTP_IDEMPOTENCY_KEY='k1')
+        retry = self.client.post(url, {'score': 3, 'total_questions': 3}, format='json', HTTP_IDEMPOTENCY_KEY='k1')
+        self.assertEqual(retry.status_code, 422)
+        self.assertEqual(ExamSession.objects.get(user=self.user).score, 2)
+
+    def test_form_bodies_are_keyed_too(self):
+        url = f'/api/save_result/{self.exam.id}/'
+        first = self.client.post(url, {'score': 2, 'total_questions': 3})
+        self.assertEqual(first.status_code, 200)
+        retry = self.client.post(url, {'total_questions': 3, 'score': 2})
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.client.post(url, {'score': 1, 'total_questions': 3}, HTTP_IDEMPOTENCY_KEY='k1')
+        retry = self.client.post(url, {'score': 3, 'total_questions': 3}, HTTP_IDEMPOTENCY_KEY='k1')
+        self.assertEqual(retry.status_code, 422)
+        self.assertEqual(ExamSession.objects.get(user=self.user).score, 1)
+
+
+class ExamStatsTests(TestCase):
+    def setUp(self):
+        question_index.clear()
+        self.exam = Exam.objects.create(name='Maths')
+
+    def _finish(self, username, score):
+        user = User.objects.create_user(username, password='pass')
+        ExamSession.objects.create(user=user, exam=self.exam, score=score)
+        client = APIClient()
+        client.force_authenticate(user)
+        client.post(f'/api/adaptive/finalize/{self.exam.id}/')
+        return client
+
+    def test_percentile_from_incremental_histogram(self):
+        for i, score in enumerate([2, 4, 4, 6]):
+            client = self._finish(f'c{i}', score)
+        data = client.get(f'/api/adaptive/percentile/{self.exam.id}/').json()
+        self.assertEqual(data['attempts'], 4)
+        self.assertEqual(data['mean_score'], 4.0)
+        self.assertEqual(data['percentile'], 87.5)  # 3 below, 1 tie
+        self.assertEqual(stats.percentile(self.exam.id, 4), 50.0)
+
+    def test_rebuild_matches_incremental(self):
+        for i, score in enumerate([1, 3, 3]):
+            self._finish(f'c{i}', score)
+        incremental = stats.histogram(self.exam.id, ExamStatsBucket.SCORE)
+        stats.rebuild(self.exam.id)
+        self.assertEqual(stats.histogram(self.exam.id, ExamStatsBucket.SCORE), incremental)
+        self.assertEqual(stats.summary(self.exam.id)['attempts'], 3)
+
+
+class SelectionTests(TestCase):
+    def setUp(self):
+        question_index.clear()
+        self.exam = Exam.objects.create(name='Physics')
+
+    def _add(self, topic, difficulty=2, count=1):
+        return [
+            Question.objects.create(exam=self.exam, text=f'{topic}{difficulty}-{i}', option1='a', option2='b',
+                                    option3='c', option4='d', correct_option=1,
+                                    topic=topic, difficulty=difficulty).id
+            for i in range(count)
+        ]
+
+    def _take(self, count, difficulty=2, asked=()):
+        asked = list(asked)
+        for _ in range(count):
+            asked.append(pick_question(self.exam, asked, difficulty).id)
+        return asked
+
+    def test_topics_follow_blueprint_weights(self):
+        self.exam.blueprint = {'optics': 2, 'waves': 1}
+        self.exam.save()
+        self._add('optics', count=30)
+        self._add('waves', count=30)
+        topics = Question.objects.filter(id__in=self._take(30)).values_list('topic', flat=True)
+        self.assertEqual(Counter(topics), {'optics': 20, 'waves': 10})
+
+    def test_nearest_difficulty_when_exhausted(self):
+        [easy] = self._add('optics', difficulty=1)
+        [medium] = self._add('optics', difficulty=2)
+        [hard] = self._add('optics', difficulty=3)
+        self.assertEqual(pick_question(self.exam, [], 3).id, hard)
+        self.assertEqual(pick_question(self.exam, [hard], 3).id, medium)
+        self.assertEqual(pick_question(self.exam, [hard, medium], 3).id, easy)
+
+    def test_topics_outside_blueprint_come_last(self):
+        self.exam.blueprint = {'optics': 1}
+        self.exam.save()
+        optics = self._add('optics', difficulty=1, count=2)
+        waves = self._add('waves', count=2)
+        # a weighted topic at another difficulty beats an unweighted exact match
+        asked = self._take(4)
+        self.assertEqual(set(asked[:2]), set(optics))
+        self.assertEqual(set(asked[2:]), set(waves))
+
+    def test_session_progress_extends_without_rescanning(self):
+        ids = self._add('optics', count=3) + self._add('waves', count=2)
+        index = question_index.get_index(self.exam)
+        progress = session_progress(index, 7, ids[:4])
+        self.assertEqual(progress.counts, {'optics': 3, 'waves': 1})
+        topic_of = question_index.ExamIndex.topic_of
+        with mock.patch.object(question_index.ExamIndex, 'topic_of', autospec=True, side_effect=topic_of) as spy:
+            self.assertIs(session_progress(index, 7, ids), progress)
+            self.assertEqual(spy.call_count, 1)  # only the newly asked id
+        self.assertEqual(progress.counts, {'optics': 3, 'waves': 2})
+        # a list that isn't an extension of the last one is rebuilt
+        self.assertEqual(session_progress(index, 7, ids[3:]).counts, {'waves': 2})
+
+    def test_none_once_everything_is_asked(self):
+        asked = self._add('optics', count=2) + self._add('waves', difficulty=3)
+        self.assertIsNone(pick_question(self.exam, asked, 2))
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.exam = Exam.objects.create(name='Geography')
+        finished_at = timezone.now() - timedelta(minutes=5)
+        for i in range(3):
+            ExamSession.objects.create(
+                user=User.objects.create_user(f'done{i}', password='pass'), exam=self.exam,
+                score=i, is_finished=True, started_at=finished_at - timedelta(minutes=30),
+                finished_at=finished_at,
+            )
+        ExamSession.objects.create(user=User.objects.create_user('open', password='pass'), exam=self.exam)
+
+    def _archive(self):
+        out = StringIO()
+        call_command('archive_sessions', days=0, batch_size=1, sleep=0, stdout=out)
+        return out.getvalue()
+
+    def test_archive_moves_finished_sessions_once(self):
+        self.assertIn('done: 3 sessions archived', self._archive())
+        self.assertEqual(ArchivedExamSession.objects.count(), 3)
+        self.assertEqual(list(ExamSession.objects.values_list('is_finished', flat=True)), [False])
+        self.assertIn('done: 0 sessions archived', self._archive())
+        self.assertEqual(ArchivedExamSession.objects.count(), 3)
+
+    def test_history_readers_include_archived_sessions(self):
+        self._archive()
+        rows = list(session_rows(exam_id=self.exam.id))
+        self.assertEqual([r['username'] for r in rows], ['done0', 'done1', 'done2', 'open'])
+        self.assertEqual([r['score'] for r in rows[:3]], [0, 1, 2])
+        totals = stats.rebuild(self.exam.id)
+        self.assertEqual((totals.attempts, totals.score_sum, totals.timed_attempts), (3, 3, 3))
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.exams = [Exam.objects.create(name=name) for name in ('Art', 'Music')]
+        for i, exam in enumerate((self.exams[0], self.exams[0], self.exams[1])):
+            ExamSession.objects.create(user=User.objects.create_user(f'user{i}', password='pass'),
+                                       exam=exam, score=i)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('staff', password='pass', is_staff=True))
+
+    def _export(self, fmt, query=''):
+        response = self.client.get(f'/api/export/sessions/{fmt}/{query}')
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode().splitlines()
+
+    def test_csv_header_and_rows(self):
+        header, *rows = self._export('csv')
+        self.assertEqual(header.split(','), EXPORT_FIELDS)
+        self.assertEqual([row.split(',')[1] for row in rows], ['user0', 'user1', 'user2'])
+
+    def test_jsonl_filtered_by_exam(self):
+        lines = self._export('jsonl', f'?exam_id={self.exams[0].id}')
+        self.assertEqual([json.loads(line)['username'] for line in lines], ['user0', 'user1'])
+
+    def test_bad_exam_id_rejected(self):
+        self.assertEqual(self.client.get('/api/export/sessions/csv/?exam_id=abc').status_code, 400)
+
+
+class WarmUpTests(TestCase):
+    def setUp(self):
+        question_index.clear()
+        user = User.objects.create_user('candidate', password='pass')
+        self.active, idle = Exam.objects.create(name='Active'), Exam.objects.create(name='Idle')
+        for exam in (self.active, idle):
+            Question.objects.create(exam=exam, text='Q', option1='a', option2='b',
+                                    option3='c', option4='d', correct_option=1)
+        ExamSession.objects.create(user=user, exam=self.active)
+        ExamSession.objects.create(user=user, exam=idle, is_finished=True)
+
+    @mock.patch.object(warmup.connections, 'close_all')
+    def test_indexes_only_exams_with_open_sessions(self, close_all):
+        result = warmup.warm_up()
+        self.assertEqual((result['exams'], result['questions']), (1, 1))
+        self.assertNotIn('error', result)
+        self.assertEqual(list(question_index._indexes), [self.active.id])
+        close_all.assert_called_once()
+
+    @mock.patch.object(warmup.connections, 'close_all')
+    def test_database_errors_are_reported(self, close_all):
+        with mock.patch.object(warmup.sharding, 'distinct_values', side_effect=DatabaseError('no such table')):
+            result = warmup.warm_up()
+        self.assertEqual(result['error'], 'DatabaseError: no such table')
+        self.assertEqual(question_index._indexes, {})
+        close_all.assert_called_once()
+
+    @mock.patch.object(warmup.connections, 'close_all')
+    def test_other_errors_are_reported(self, close_all):
+        with mock.patch.object(warmup.question_index, 'build_index', side_effect=RuntimeError('boom')):
+            result = warmup.warm_up()
+        self.assertEqual(result['error'], 'RuntimeError: boom')
+
+    def test_boot_warm_up_runs_outside_the_event_loop(self):
+        # ASGI servers import the app inside a running loop
+        def in_loop():
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                return {'in_loop': False}
+            return {'in_loop': True}
+
+        async def boot():
+            return warmup.warm_up_on_boot()
+
+        with mock.patch.object(warmup, 'warm_up', side_effect=in_loop):
+            self.assertEqual(asyncio.run(boot()), {'in_loop': False})
+
+
+class SpeculativeNextQuestionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        question_index.clear()
+        self.exam = Exam.objects.create(name='Geography')
+        for i in range(4):
+            Question.objects.create(exam=self.exam, text=f'Q{i}', option1='a', option2='b',
+                                    option3='c', option4='d', correct_option=1, difficulty=2)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('candidate', password='pass'))
+
+    def _check(self, question_id):
+        return self.client.post('/api/adaptive/check_answer/',
+                                {'exam_id': self.exam.id, 'question_id': question_id, 'answer': 1},
+                                format='json').json()
+
+    def test_answers_chain_through_precomputed_questions(self):
+        q = self.client.get(f'/api/adaptive/next/{self.exam.id}/').json()['question']
+        seen = [q['id']]
+        for _ in range(SPECULATION_DEPTH):
+            with CaptureQueriesContext(connection) as ctx:
+                data = self._check(q['id'])
+            # no selection, Question or Exam row loads on the answer path
+            sql = ' '.join(query['sql'] for query in ctx.captured_queries)
+            self.assertNotIn('"cbt_app_question"', sql)
+            self.assertNotIn('"cbt_app_exam"."name"', sql)
+            q = data['next_question']
+            self.assertIsNotNone(q)
+            self.assertNotIn(q['id'], seen)
+            self.assertEqual(ExamSession.objects.get().pending_question_id, q['id'])
+            seen.append(q['id'])
+        # the chain has run out: the client fetches, which plans the next one
+        data = self._check(q['id'])
+        self.assertFalse(data['done'])
+        self.assertIsNone(data['next_question'])
+        q = self.client.get(f'/api/adaptive/next/{self.exam.id}/').json()['question']
+        self.assertNotIn(q['id'], seen)
+        self.assertTrue(self._check(q['id'])['done'])
+
+    def test_bank_edit_discards_precomputed_question(self):
+        q = self.client.get(f'/api/adaptive/next/{self.exam.id}/').json()['question']
+        with self.captureOnCommitCallbacks(execute=True):
+            Question.objects.exclude(id=q['id']).first().save()
+        data = self._check(q['id'])
+        self.assertIsNone(data['next_question'])
+        session = ExamSession.objects.get()
+        self.assertIsNone(session.pending_question_id)
+        self.assertIsNone(session.speculative_next)
+        fresh = self.client.get(f'/api/adaptive/next/{self.exam.id}/').json()['question']
+        self.assertNotEqual(fresh['id'], q['id'])
+        self.assertEqual(ExamSession.objects.get().pending_question_id, fresh['id'])
+
+
+class BundleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        question_index.clear()
+        self.exam = Exam.objects.create(name='Chemistry')
+        self.questions = [
+            Question.objects.create(exam=self.exam, text=f'Q{i}', option1='a', option2='b',
+                                    option3='c', option4='d', correct_option=i + 1).id
+            for i in range(3)
+        ]
+        self.user = User.objects.create_user('candidate', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _fixed_form(self):
+        ExamSession.objects.create(user=self.user, exam=self.exam, adaptive=False)
+
+    def _submit(self, answers):
+        return self.client.post(f'/api/adaptive/submit_batch/{self.exam.id}/', {'answers': answers}, format='json')
+
+    def test_bundle_only_for_fixed_form_sessions(self):
+        self.assertNotIn('bundle', self.client.post(f'/api/adaptive/begin/{self.exam.id}/').json())
+        ExamSession.objects.update(adaptive=False)
+        bundle = self.client.post(f'/api/adaptive/begin/{self.exam.id}/').json()['bundle']
+        self.assertNotIn('correct_option', bundle['fields'])
+        self.assertEqual([row[0] for row in bundle['rows']], self.questions)
+        self.assertTrue(all(len(row) == len(bundle['fields']) for row in bundle['rows']))
+
+    def test_batch_is_graded_and_resubmissions_skipped(self):
+        self._fixed_form()
+        first, second, third = self.questions
+        data = self._submit({str(first): 1, str(second): 3}).json()
+        self.assertEqual(data['results'], [[first, True], [second, False]])
+        self.assertEqual(data['score'], 1)
+        self.assertFalse(data['done'])
+
+        other = Exam.objects.create(name='Other')
+        foreign = Question.objects.create(exam=other, text='X', option1='a', option2='b',
+                                          option3='c', option4='d', correct_option=1).id
+        data = self._submit([[first, 2], [third, 3], [foreign, 1]]).json()
+        self.assertEqual(data['results'], [[third, True]])
+        self.assertEqual(data['skipped'], [first, foreign])
+        self.assertEqual(data['score'], 2)
+        self.assertTrue(data['done'])
+        self.assertEqual(ExamSession.objects.get().score, 2)
+        self.assertEqual(SessionAnswer.objects.count(), 3)
+
+    def test_malformed_answers_rejected(self):
+        self._fixed_form()
+        for answers in ({str(self.questions[0]): 5}, {'x': 1}, [[self.questions[0]]], 'abc'):
+            self.assertEqual(self._submit(answers).status_code, 400, answers)
+        self.assertEqual(ExamSession.objects.get().asked_question_ids, [])
+
+    def test_adaptive_sessions_rejected(self):
+        response = self._submit({str(self.questions[0]): 1})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(ExamSession.objects.get().score, 0)
+
+
+class AnswerKeyGradingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        question_index.clear()
+        self.exam = Exam.objects.create(name='History')
+        for i in range(3):
+            Question.objects.create(exam=self.exam, text=f'Q{i}', option1='a', option2='b',
+                                    option3='c', option4='d', correct_option=1)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('candidate', password='pass'))
+
+    def _answer(self, answer=1):
+        q = self.client.get(f'/api/adaptive/next/{self.exam.id}/').json()['question']
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.post('/api/adaptive/check_answer/',
+                                    {'exam_id': self.exam.id, 'question_id': q['id'], 'answer': answer},
+                                    format='json').json()
+        tables = ' '.join(query['sql'] for query in ctx.captured_queries)
+        return q['id'], data, tables
+
+    def test_grading_reads_only_the_bank_version(self):
+        # mid-exam: the answer also serves the next question
+        _, data, tables = self._answer()
+        self.assertTrue(data['is_correct'])
+        self.assertFalse(data['done'])
+        self.assertIsNotNone(data['next_question'])
+        self.assertNotIn('"cbt_app_question"', tables)
+        self.assertIn('SELECT "cbt_app_exam"."bank_version" AS "bank_version" FROM "cbt_app_exam"', tables)
+        self.assertNotIn('"cbt_app_exam"."name"', tables)
+
+    def test_shared_cache_skips_the_exam_row(self):
+        self.addCleanup(question_index.configure)  # after the settings are restored
+        with tempfile.TemporaryDirectory() as location, override_settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}}):
+            question_index.configure()
+            self._answer()  # caches the bank version
+            _, data, tables = self._answer()
+        self.assertFalse(data['done'])
+        self.assertIsNotNone(data['next_question'])
+        self.assertNotIn('"cbt_app_question"', tables)
+        self.assertNotIn('"cbt_app_exam"', tables)
+
+    def test_local_cache_ignores_a_cached_version(self):
+        # another worker's edit can't clear this process's cache
+        self._answer()
+        pending = ExamSession.objects.get().pending_question_id
+        self.exam.refresh_from_db()
+        cache.set(question_index._version_key(self.exam.id), self.exam.bank_version, 60)
+        Question.objects.filter(id=pending).update(correct_option=2)
+        Exam.objects.filter(id=self.exam.id).update(bank_version=F('bank_version') + 1)
+        data = self.client.post('/api/adaptive/check_answer/',
+                                {'exam_id': self.exam.id, 'question_id': pending, 'answer': 2},
+                                format='json').json()
+        self.assertTrue(data['is_correct'])
+
+    def test_question_save_invalidates_key(self):
+        self._answer()
+        asked = ExamSession.objects.get().asked_question_ids
+        with self.captureOnCommitCallbacks(execute=True):
+            for q in Question.objects.filter(exam=self.exam).exclude(id__in=asked):
+                q.correct_option = 2
+                q.save()
+        self.assertEqual(question_index.get_index_for(self.exam.id).answer(q.id)[0], 2)
+        _, data, _ = self._answer(answer=2)
+        self.assertTrue(data['is_correct'])
+        self.assertEqual(data['correct_answer'], 2)
+
+
+class RescoringTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        question_index.clear()
+        self.exam = Exam.objects.create(name='Biology')
+        self.questions = [
+            Question.objects.create(exam=self.exam, text=f'Q{i}', option1='a', option2='b',
+                                    option3='c', option4='d', correct_option=1)
+            for i in range(2)
+        ]
+
+    def _take(self, username, answer, finish=True):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username, password='pass'))
+        for _ in self.questions:
+            q = client.get(f'/api/adaptive/next/{self.exam.id}/').json()['question']
+            client.post('/api/adaptive/check_answer/',
+                        {'exam_id': self.exam.id, 'question_id': q['id'], 'answer': answer}, format='json')
+        if finish:
+            client.post(f'/api/adaptive/finalize/{self.exam.id}/')
+
+    def _scores(self):
+        return dict(ExamSession.objects.values_list('user__username', 'score'))
+
+    def test_corrected_key_rescores_finished_sessions(self):
+        self._take('picked1', 1)
+        self._take('picked2', 2)
+        self._take('in_progress', 2, finish=False)
+        self.assertEqual(SessionAnswer.objects.count(), 6)
+        Question.objects.filter(id=self.questions[0].id).update(correct_option=2)
+
+        preview = rescoring.rescore([self.questions[0].id], dry_run=True)[0]
+        self.assertEqual((preview['gained'], preview['lost'], preview['unfinished_skipped']), (1, 1, 1))
+        self.assertEqual(self._scores(), {'picked1': 2, 'picked2': 0, 'in_progress': 0})
+
+        rescoring.rescore([q.id for q in self.questions], batch_size=1)
+        self.assertEqual(self._scores(), {'picked1': 1, 'picked2': 1, 'in_progress': 0})
+        self.assertEqual(stats.summary(self.exam.id)['mean_score'], 1.0)
+        # answers are re-marked, so running again changes nothing
+        again = rescoring.rescore([q.id for q in self.questions])
+        self.assertEqual(sum(r['gained'] + r['lost'] for r in again), 0)
+
+    def test_timed_out_session_counts_as_closed(self):
+        # completed via save_result and abandoned: never finalized, but its timer ran out
+        self._take('abandoned', 2, finish=False)
+        ExamSession.objects.update(ends_at=timezone.now() - timedelta(minutes=1))
+        Question.objects.filter(exam=self.exam).update(correct_option=2)
+        preview = rescoring.rescore([q.id for q in self.questions], dry_run=True)
+        self.assertEqual(sum(r['unfinished_skipped'] for r in preview), 0)
+        rescoring.rescore([q.id for q in self.questions])
+        self.assertEqual(self._scores(), {'abandoned': 2})
+
+    @override_settings(LIVE_SESSION_STATE=True, LIVE_SESSION_FLUSH_SECONDS=3600)
+    def test_timed_out_live_session_is_flushed_before_rescoring(self):
+        self._take('timed_out', 1, finish=False)
+        self.assertEqual(self._scores(), {'timed_out': 0})  # score and answers still in the cache
+        ExamSession.objects.update(started_at=timezone.now() - timedelta(hours=2),
+                                   ends_at=timezone.now() - timedelta(minutes=1))
+        Question.objects.filter(exam=self.exam).update(correct_option=2)
+        rescoring.rescore([q.id for q in self.questions])
+        self.assertEqual(self._scores(), {'timed_out': 0})
+        self.assertEqual(SessionAnswer.objects.filter(is_correct=False).count(), 2)
+        # the next request hits time-up and finalizes from the rescored row
+        client = APIClient()
+        client.force_authenticate(User.objects.get(username='timed_out'))
+        self.assertEqual(client.get(f'/api/adaptive/next/{self.exam.id}/').json()['score'], 0)
+        self.assertEqual(stats.summary(self.exam.id)['mean_score'], 0.0)
+
+
+def _hot(n):
+    return sum(i * i for i in range(n))
+
+
+class ProfilerTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.dir = directory.name
+        self.conf = {'ENABLED': True, 'ROUTES': ['/api/adaptive/'], 'SAMPLE_RATE': 1,
+                     'SLOW_MS': None, 'DIR': self.dir, 'MAX_FILES': 3}
+
+    def _request(self, path='/api/adaptive/next/1/', **conf):
+        def view(request):
+            _hot(1000)
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            return HttpResponse()
+
+        with override_settings(PROFILER={**self.conf, **conf}):
+            SamplingProfilerMiddleware(view)(RequestFactory().get(path))
+        return [meta for meta, _ in profiles.load_profiles(self.dir)]
+
+    def _save(self, route, elapsed_ms, queries, conf=None):
+        profiler = cProfile.Profile()
+        profiler.runcall(_hot, 1000)
+        return profiles.save_profile(profiler, conf or self.conf, {
+            'route': route, 'method': 'GET', 'status': 200,
+            'elapsed_ms': elapsed_ms, 'queries': queries, 'sampled': True,
+        })
+
+    def test_sampled_request_is_saved(self):
+        [meta] = self._request()
+        self.assertEqual(meta['route'], '/api/adaptive/next/1/')
+        self.assertEqual((meta['status'], meta['queries'], meta['sampled']), (200, 1, True))
+        self.assertEqual(self._request(path='/admin/'), [meta])  # other routes are never profiled
+
+    def test_unsampled_requests_are_kept_only_when_slow(self):
+        with mock.patch('cbt_app.middleware.random.random', return_value=0.5), \
+                mock.patch('cbt_app.middleware.cProfile.Profile', wraps=cProfile.Profile) as profile:
+            self.assertEqual(self._request(SAMPLE_RATE=1000), [])
+            profile.assert_not_called()  # pure sampling: no profiler on unsampled requests
+            self.assertEqual(self._request(SAMPLE_RATE=1000, SLOW_MS=60000), [])
+            [meta] = self._request(SAMPLE_RATE=1000, SLOW_MS=0)
+        self.assertFalse(meta['sampled'])
+
+    def test_queries_are_counted_on_every_connection(self):
+        other = connections.create_connection('default')
+        self.addCleanup(other.close)
+
+        def view(request):
+            for conn in (connection, other, other):
+                with conn.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+            return HttpResponse()
+
+        with mock.patch('cbt_app.middleware.connections.all', return_value=[connection, other]), \
+                override_settings(PROFILER=self.conf):
+            SamplingProfilerMiddleware(view)(RequestFactory().get('/api/adaptive/next/1/'))
+        [(meta, _)] = profiles.load_profiles(self.dir)
+        self.assertEqual(meta['queries'], 3)
+
+    def test_ring_keeps_the_newest_max_files(self):
+        with mock.patch('cbt_app.profiles.time.time_ns', side_effect=range(10**18, 10**18 + 5)):
+            for i in range(5):
+                self._save(f'/r{i}/', 1.0, 0)
+        self.assertEqual([meta['route'] for meta, _ in profiles.load_profiles(self.dir)],
+                         ['/r2/', '/r3/', '/r4/'])
+
+    def test_hotspots_aggregate_per_route(self):
+        conf = {**self.conf, 'MAX_FILES': 10}
+        self._save('api/adaptive/next/<int:exam_id>/', 10.0, 2, conf)
+        self._save('api/adaptive/next/<int:exam_id>/', 20.0, 4, conf)
+        self._save('api/adaptive/check_answer/', 50.0, 1, conf)
+        out = StringIO()
+        call_command('profile_hotspots', dir=self.dir, sort='ncalls', stdout=out)
+        lines = out.getvalue().splitlines()
+        # slowest route (by total time) first
+        self.assertEqual(lines[:2], [
+            'api/adaptive/check_answer/: 1 profiles | mean 50.0 ms | mean 1.0 queries',
+            'api/adaptive/next/<int:exam_id>/: 2 profiles | mean 15.0 ms | mean 3.0 queries',
+        ])
+        self.assertRegex(out.getvalue(), r'\b3003\b.*<genexpr>')  # 3 profiles x 1001 generator steps
+
+        out = StringIO()
+        call_command('profile_hotspots', dir=self.dir, route='check_answer', stdout=out)
+        self.assertIn('check_answer/: 1 profiles', out.getvalue())
+        self.assertNotIn('exam_id', out.getvalue())
+
+        out = StringIO()
+        call_command('profile_hotspots', dir=self.dir, route='missing', stdout=out)
+        self.assertEqual(out.getvalue().strip(), f'No profiles found in {self.dir}')
@@ -0,0 +1,54 @@
+import time
+
+from django.core.cache import cache as default_cache
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Per-user token bucket kept in the cache: one get + one set per request.
+    The rate comes from REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'][scope]
+    ("N/period"): the bucket holds N tokens and refills N per period, so
+    short bursts pass while a retry loop is cut off. The read-modify-write
+    is not atomic, so concurrent requests may slightly overdraw a bucket.
+    """
+    scope = None
+    cache = default_cache
+    durations = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+    def __init__(self):
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+        self.capacity, self.period = self.parse_rate(rate) if rate else (None, None)
+        self.retry_after = None
+
+    def parse_rate(self, rate):
+        num, period = rate.split('/')
+        return int(num), self.durations[period[0]]
+
+    def allow_request(self, request, view):
+        if self.capacity is None or not request.user.is_authenticated:
+            return True
+        key = f'cbt:throttle:{self.scope}:{request.user.pk}'
+        now = time.time()
+        tokens, last = self.cache.get(key, (self.capacity, now))
+        refill = self.capacity / self.period
+        tokens = min(self.capacity, tokens + (now - last) * refill)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        else:
+            self.retry_after = (1 - tokens) / refill
+        self.cache.set(key, (tokens, now), self.period)
+        return allowed
+
+    def wait(self):
+        return self.retry_after
+
+
+class AnswerRateThrottle(TokenBucketThrottle):
+    scope = 'adaptive_answer'
+
+
+class StatusRateThrottle(TokenBucketThrottle):
+    scope = 'adaptive_status'
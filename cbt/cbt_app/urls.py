@@ -12,6 +12,10 @@ urlpatterns = [
     path('adaptive/begin/<int:exam_id>/', views.adaptive_begin),
     path('adaptive/status/<int:exam_id>/', views.adaptive_status),
     path('adaptive/finalize/<int:exam_id>/', views.adaptive_finalize),
+    path('adaptive/submit_batch/<int:exam_id>/', views.adaptive_submit_batch),
+    path('adaptive/percentile/<int:exam_id>/', views.adaptive_percentile),
+    # exports
+    path('export/sessions/<str:fmt>/', views.export_sessions),
  
 ]
     # classic
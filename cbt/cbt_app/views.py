@@ -1,14 +1,21 @@
-import random
 import requests
 from django.utils import timezone
 from datetime import timedelta
 from django.shortcuts import render, redirect
 from django.contrib import messages
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
 from .models import Question, Exam, ExamSession
 from .serializers import QuestionSerializer
+from .exports import RENDERERS, session_rows
+from . import live_state, question_index, rescoring, stats
+from .db_routers import iter_replica_reads, replica_reads
+from .throttling import AnswerRateThrottle, StatusRateThrottle
+from .idempotency import idempotent
+from .selection import pick_question, pick_question_id, session_progress
+from .bundles import bundle_payload, grade, parse_answers
+from django.http import StreamingHttpResponse
 from django.contrib.auth import authenticate, login
 from django.contrib.auth.decorators import login_required
 
@@ -48,14 +55,76 @@ def _next_difficulty(current: int, got_it_right: bool) -> int:
         return min(3, current + 1)
     return max(1, current - 1)
 
+def _speculation_valid(session: ExamSession, bank_version: int, question_id: int) -> bool:
+    spec = session.speculative_next
+    return bool(spec) and (
+        spec.get("for") == question_id
+        and spec.get("version") == bank_version
+        and spec.get("difficulty") == session.current_difficulty
+    )
+
+# answers that can chain through precomputed questions before the next fetch
+SPECULATION_DEPTH = 2
+
+def _plan(index, blueprint, progress, exclude, difficulty: int, depth: int) -> dict:
+    """
+    Follow-up ids for both outcomes, `depth` answers ahead (in memory, no
+    queries). `exclude` holds the ids beyond `progress` along this branch.
+    """
+    plan = {}
+    for key, got_it_right in (("correct", True), ("incorrect", False)):
+        next_difficulty = _next_difficulty(difficulty, got_it_right)
+        qid = pick_question_id(index, blueprint, exclude, next_difficulty, progress)
+        plan[key] = None if qid is None else {
+            "id": qid,
+            "next": _plan(index, blueprint, progress, exclude + [qid], next_difficulty, depth - 1)
+            if depth > 1 else None,
+        }
+    return plan
+
+def _plan_ids(plan):
+    for branch in filter(None, (plan or {}).values()):
+        yield branch["id"]
+        yield from _plan_ids(branch["next"])
+
+def _with_payloads(plan, payloads):
+    """Swap planned ids for serialized questions; ids deleted meanwhile drop out."""
+    if plan is None:
+        return None
+    return {
+        key: {"question": payloads[branch["id"]], "next": _with_payloads(branch["next"], payloads)}
+        if branch and branch["id"] in payloads else None
+        for key, branch in plan.items()
+    }
+
+def _speculate(session: ExamSession, exam: Exam, question_id: int) -> bool:
+    """
+    When a question is served, pre-select the follow-ups for both outcomes,
+    and theirs, SPECULATION_DEPTH answers deep, and load them in one query.
+    adaptive_check_answer then commits the matching branch and returns it
+    with no selection or Question query; once a chain runs out the client
+    fetches, which plans the next one. Tagged with exam.bank_version; any
+    bank edit makes it stale. Returns True if session.speculative_next
+    changed (caller saves).
+    """
+    if _speculation_valid(session, exam.bank_version, question_id):
+        return False
+    index = question_index.get_index(exam)
+    progress = session_progress(index, session.id, session.asked_question_ids)
+    plan = _plan(index, exam.blueprint, progress, [question_id], session.current_difficulty, SPECULATION_DEPTH)
+    questions = Question.objects.filter(id__in=set(_plan_ids(plan)))
+    payloads = {q["id"]: q for q in QuestionSerializer(questions, many=True).data}
+    session.speculative_next = {
+        "for": question_id, "version": exam.bank_version, "difficulty": session.current_difficulty,
+        **_with_payloads(plan, payloads),
+    }
+    return True
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def adaptive_next_question(request, exam_id: int):
     exam = Exam.objects.get(id=exam_id)
-    session, _ = ExamSession.objects.get_or_create(
-        user=request.user, exam=exam,
-        defaults={'current_difficulty': 2, 'adaptive': True}
-    )
+    session = live_state.load_session(request.user, exam)
     if session.started_at and session.ends_at and _now() >= session.ends_at:
         # time is up → finalize and stop
         summary = _finalize_session(session)
@@ -66,12 +135,14 @@ def adaptive_next_question(request, exam_id: int):
             "total_questions": summary["total_questions"],
             "score": summary["score"],
         }, status=200)
-    total_questions = Question.objects.filter(exam=exam).count()
+    total_questions = question_index.get_index(exam).total
 
     # ✅ If there is a pending question, re-serve it
     if session.pending_question_id:
         try:
             q = Question.objects.get(id=session.pending_question_id, exam=exam)
+            if _speculate(session, exam, q.id):
+                live_state.save_session(session)
             serializer = QuestionSerializer(q)
             return Response({
                 "done": False,
@@ -83,21 +154,17 @@ def adaptive_next_question(request, exam_id: int):
         except Question.DoesNotExist:
             # stale id; clear and continue
             session.pending_question_id = None
-            session.save()
+            live_state.save_session(session)
 
     # No pending: choose a new one
-    base_qs = Question.objects.filter(exam=exam).exclude(id__in=session.asked_question_ids)
-    pool = base_qs.filter(difficulty=session.current_difficulty)
-    if not pool.exists():
-        pool = base_qs
-
-    if not pool.exists():
+    q = pick_question(exam, session.asked_question_ids, session.current_difficulty, session_id=session.id)
+    if q is None:
         # nothing left
         return Response({"done": True, "message": "Exam complete.", "total_questions": total_questions}, status=200)
 
-    q = random.choice(list(pool))
     session.pending_question_id = q.id  # mark as pending (not yet asked)
-    session.save()
+    _speculate(session, exam, q.id)
+    live_state.save_session(session)
 
     serializer = QuestionSerializer(q)
     return Response({
@@ -112,18 +179,21 @@ def adaptive_next_question(request, exam_id: int):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@throttle_classes([AnswerRateThrottle])
+@idempotent(lambda request: f"{request.data.get('exam_id')}:{request.data.get('question_id')}")
 def adaptive_check_answer(request):
     
     exam_id = int(request.data.get("exam_id"))
     question_id = int(request.data.get("question_id"))
     user_answer = int(request.data.get("answer"))
 
-    exam = Exam.objects.get(id=exam_id)
-    q = Question.objects.get(id=question_id, exam=exam)
-    session, _ = ExamSession.objects.get_or_create(
-        user=request.user, exam=exam,
-        defaults={'current_difficulty': 2, 'adaptive': True}
-    )
+    # grading reads the in-memory answer key: no Exam/Question queries
+    index = question_index.get_index_for(exam_id)
+    answer = index.answer(question_id)
+    if answer is None:
+        raise Question.DoesNotExist(f"Question {question_id} is not in exam {exam_id}.")
+    correct_option, _ = answer
+    session = live_state.load_session(request.user, exam_id)
     if session.started_at and session.ends_at and _now() >= session.ends_at:
         # time is up → finalize and stop
         summary = _finalize_session(session)
@@ -134,9 +204,16 @@ def adaptive_check_answer(request):
             "total_questions": summary["total_questions"],
             "score": summary["score"],
         }, status=200)
-    total_questions = Question.objects.filter(exam=exam).count()
+    total_questions = index.total
+
+    is_correct = (user_answer == correct_option)
+
+    # Commit the precomputed branch for this outcome (discarded if the bank changed)
+    branch = None
+    if _speculation_valid(session, index.version, question_id):
+        branch = session.speculative_next["correct" if is_correct else "incorrect"]
+    session.speculative_next = None
 
-    is_correct = (user_answer == q.correct_option)
     if is_correct:
         session.score += 1
         session.correct_streak += 1
@@ -146,36 +223,54 @@ def adaptive_check_answer(request):
         session.correct_streak = 0
 
     # Commit the question as answered and clear the pending session
-    if q.id not in session.asked_question_ids:
-        session.asked_question_ids = session.asked_question_ids + [q.id]
+    if question_id not in session.asked_question_ids:
+        session.asked_question_ids = session.asked_question_ids + [question_id]
+        rescoring.record_answers(session, [(question_id, user_answer, is_correct)])
     session.pending_question_id = None
 
     # Step difficulty
     session.current_difficulty = _next_difficulty(session.current_difficulty, is_correct)
-    session.save()
 
     done = len(session.asked_question_ids) >= total_questions
+    next_question = None
+    if branch and not done:
+        # served in this response; its own follow-ups were planned with it
+        next_question = branch["question"]
+        session.pending_question_id = next_question["id"]
+        if branch["next"]:
+            session.speculative_next = {
+                "for": next_question["id"], "version": index.version,
+                "difficulty": session.current_difficulty, **branch["next"],
+            }
+    live_state.save_session(session)
 
     return Response({
         "is_correct": is_correct,
-        "correct_answer": q.correct_option,
+        "correct_answer": correct_option,
         "score": session.score,
         "asked_count": len(session.asked_question_ids),   # answered so far
         "total_questions": total_questions,
         "current_difficulty": session.current_difficulty,
-        "done": done
+        "done": done,
+        "next_question": next_question,
     }, status=200)
 
 
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent(lambda request, exam_id: f"{exam_id}:{request.data.get('score')}:{request.data.get('total_questions')}")
 def save_exam_result(request, exam_id):
     try:
         score = int(request.data.get("score"))
         total_questions = int(request.data.get("total_questions"))
         exam = Exam.objects.get(id=exam_id)
-        ExamSession.objects.update_or_create(
+        live = ExamSession.objects.for_exam(exam).filter(user=request.user).first()
+        if live is not None:
+            # write back live answers first so a later flush can't overwrite this
+            live_state.flush([live.id])
+            live_state.discard(live)
+        ExamSession.objects.for_exam(exam).update_or_create(
             user=request.user,
             exam=exam,
             defaults={'score': score, 'current_question': total_questions}
@@ -203,8 +298,10 @@ def _finalize_session(session: ExamSession) -> dict:
         session.finished_at = _now()
         # mark position as complete
         session.current_question = len(session.asked_question_ids)
-        session.save()
-    total = Question.objects.filter(exam=session.exam).count()
+        session.save()  # full row save also persists any live state
+        live_state.discard(session)
+        stats.record_finished(session)
+    total = question_index.get_index(session.exam).total
     return {
         "status": "finalized",
         "score": session.score,
@@ -218,36 +315,91 @@ def adaptive_begin(request, exam_id: int):
     """
     Start exam timer if it hasn't started. Idempotent.
     Returns: { started_at, ends_at, remaining_seconds }
+    Fixed-form sessions (adaptive=False) also get the whole question set
+    as `bundle`, answered later via adaptive_submit_batch.
     """
     exam = Exam.objects.get(id=exam_id)
-    session, _ = ExamSession.objects.get_or_create(
-        user=request.user, exam=exam,
-        defaults={'current_difficulty': 2, 'adaptive': True}
-    )
+    session = live_state.load_session(request.user, exam)
     if not session.started_at or not session.ends_at:
         session.started_at = _now()
         session.ends_at = session.started_at + timedelta(minutes=exam.duration_minutes)
         session.save()
-    return Response({
+    payload = {
         "started_at": session.started_at,
         "ends_at": session.ends_at,
         "remaining_seconds": _remaining_seconds(session),
         "duration_minutes": exam.duration_minutes,
         "is_finished": session.is_finished,
+    }
+    if not session.adaptive:
+        payload["bundle"] = bundle_payload(exam)
+        payload["answered_ids"] = session.asked_question_ids
+    return Response(payload, status=200)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@throttle_classes([AnswerRateThrottle])
+def adaptive_submit_batch(request, exam_id: int):
+    """
+    Grade many answers for a fixed-form session in one request.
+    Body: { answers: {question_id: 1-4, ...} } (or a list of pairs).
+    Already-answered questions are skipped, so resubmitting is harmless.
+    """
+    exam = Exam.objects.get(id=exam_id)
+    session = live_state.load_session(request.user, exam)
+    if session.adaptive:
+        return Response({"error": "Batch submission is only for fixed-form sessions."}, status=400)
+    if session.is_finished:
+        return Response({"error": "Exam already finalized."}, status=400)
+    if session.started_at and session.ends_at and _now() >= session.ends_at:
+        summary = _finalize_session(session)
+        return Response({
+            "done": True,
+            "time_up": True,
+            "message": "Time is up.",
+            "total_questions": summary["total_questions"],
+            "score": summary["score"],
+        }, status=200)
+    try:
+        answers = parse_answers(request.data.get("answers") or {})
+    except (TypeError, ValueError) as e:
+        return Response({"error": str(e)}, status=400)
+
+    already = set(session.asked_question_ids)
+    fresh = {qid: a for qid, a in answers.items() if qid not in already}
+    results = grade(exam, fresh)
+
+    session.score += sum(results.values())
+    session.asked_question_ids = session.asked_question_ids + sorted(results)
+    rescoring.record_answers(session, [(qid, fresh[qid], ok) for qid, ok in results.items()])
+    live_state.save_session(session)
+
+    total_questions = question_index.get_index(exam).total
+    return Response({
+        "results": [[qid, ok] for qid, ok in sorted(results.items())],
+        "skipped": sorted(set(answers) - set(results)),  # already answered or not in this exam
+        "score": session.score,
+        "asked_count": len(session.asked_question_ids),
+        "total_questions": total_questions,
+        "done": len(session.asked_question_ids) >= total_questions,
     }, status=200)
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@throttle_classes([StatusRateThrottle])
+@replica_reads
 def adaptive_status(request, exam_id: int):
     """
     Status for header: pending + remaining_seconds.
     """
     exam = Exam.objects.get(id=exam_id)
-    session, _ = ExamSession.objects.get_or_create(
-        user=request.user, exam=exam,
-        defaults={'current_difficulty': 2, 'adaptive': True}
-    )
-    total = Question.objects.filter(exam=exam).count()
+    # plain read first so polling can be served by the read replica
+    session = ExamSession.objects.for_exam(exam).filter(user=request.user).first()
+    if session is None:
+        session = live_state.load_session(request.user, exam)
+    else:
+        live_state.overlay(session)  # live answers may not be flushed yet
+    total = question_index.get_index(exam).total
     pending = bool(session.pending_question_id)
     remaining = _remaining_seconds(session) if session.started_at else 0
     return Response({
@@ -268,11 +420,54 @@ def adaptive_finalize(request, exam_id: int):
     Force finalize (used by frontend when timer hits 0).
     """
     exam = Exam.objects.get(id=exam_id)
-    session = ExamSession.objects.get(user=request.user, exam=exam)
+    # read-modify-write: _finalize_session saves the whole row
+    session = live_state.overlay(ExamSession.objects.for_exam(exam).get(user=request.user))
     summary = _finalize_session(session)
     return Response(summary, status=200)
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@replica_reads
+def adaptive_percentile(request, exam_id: int):
+    """
+    Candidate's percentile among finished attempts of this exam,
+    computed from the incrementally maintained score histogram.
+    """
+    exam = Exam.objects.get(id=exam_id)
+    session = ExamSession.objects.for_exam(exam).filter(user=request.user).first()
+    if session is None:
+        return Response({"error": "No session for this exam."}, status=404)
+    live_state.overlay(session)
+    return Response({
+        "score": session.score,
+        "is_finished": session.is_finished,
+        "percentile": stats.percentile(exam.id, session.score),
+        **stats.summary(exam.id),
+    }, status=200)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+@replica_reads
+def export_sessions(request, fmt: str):
+    """
+    Stream all session results as CSV or JSONL (staff only).
+    Optional ?exam_id= filter. Rows are generated lazily, so the first
+    bytes go out immediately and memory stays flat for large cohorts.
+    """
+    if fmt not in RENDERERS:
+        return Response({"error": f"Unknown format '{fmt}'."}, status=404)
+    exam_id = request.query_params.get("exam_id")
+    if exam_id and not exam_id.isdigit():
+        return Response({"error": "exam_id must be an integer."}, status=400)
+    renderer, content_type = RENDERERS[fmt]
+    response = StreamingHttpResponse(
+        renderer(iter_replica_reads(session_rows(exam_id=int(exam_id) if exam_id else None))),
+        content_type=content_type,
+    )
+    response["Content-Disposition"] = f'attachment; filename="exam_sessions.{fmt}"'
+    return response
 
 
 
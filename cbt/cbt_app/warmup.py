@@ -0,0 +1,49 @@
+import threading
+import time
+
+from django.db import connections
+
+from . import question_index, sharding
+from .models import Exam, ExamSession, Question
+from .serializers import QuestionSerializer
+
+
+def warm_up() -> dict:
+    """
+    Prime per-process caches before the first request: question indexes
+    for exams with unfinished sessions, plus one serializer round-trip.
+    Returns timing stats; never raises: a failure (e.g. no tables before
+    migrate) is reported under 'error' and the worker boots cold.
+    """
+    start = time.perf_counter()
+    stats = {'exams': 0, 'questions': 0}
+    try:
+        exam_ids = sharding.distinct_values(ExamSession.objects.filter(is_finished=False), 'exam_id')
+        active = Exam.objects.filter(id__in=exam_ids)
+        for exam in active:
+            index = question_index.build_index(exam)
+            stats['exams'] += 1
+            stats['questions'] += index.total
+        q = Question.objects.first()
+        if q is not None:
+            QuestionSerializer(q).data
+    except Exception as e:
+        stats['error'] = f'{type(e).__name__}: {e}'
+    finally:
+        # don't hand an open connection to forked workers (gunicorn --preload)
+        connections.close_all()
+    stats['seconds'] = round(time.perf_counter() - start, 3)
+    return stats
+
+
+def warm_up_on_boot() -> dict:
+    """
+    warm_up() for wsgi.py/asgi.py. ASGI servers import the application
+    inside a running event loop, where the ORM refuses to run, so it runs
+    in a thread of its own; the import waits for it either way.
+    """
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(warm_up()), name='cbt-warm-up')
+    thread.start()
+    thread.join()
+    return result
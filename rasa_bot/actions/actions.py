@@ -16,6 +16,23 @@ def get_auth_headers(tracker: Tracker) -> Dict[str, str]:
         return {"Authorization": f"Bearer {token}"}
     return {}
 
+def render_question(dispatcher: CollectingDispatcher, q: Dict[Text, Any], asked_count, total_questions, difficulty) -> List[Dict[Text, Any]]:
+    """Show a served question and return the slot events that track it."""
+    options = {'A': q["option1"], 'B': q["option2"], 'C': q["option3"], 'D': q["option4"]}
+    diff_map = {1: "Easy", 2: "Medium", 3: "Hard"}
+    question_text = (
+        f"({diff_map.get(int(difficulty), 'Medium')}) "
+        f"Question {int(asked_count)}/{int(total_questions)}:\n"
+        f"{q['text']}\n\n" + "\n".join([f"{k}. {v}" for k, v in options.items()])
+    )
+    dispatcher.utter_message(text=question_text)
+    return [
+        SlotSet("question_id", str(q["id"])),
+        SlotSet("asked_count", float(asked_count)),
+        SlotSet("total_questions", float(total_questions)),
+        SlotSet("difficulty", float(difficulty))
+    ]
+
 class ActionFetchQuestion(Action):
     def name(self) -> Text:
         return "action_fetch_question"
@@ -41,22 +58,10 @@ class ActionFetchQuestion(Action):
                     
                 ]
 
-            q = data["question"]
-            options = {'A': q["option1"], 'B': q["option2"], 'C': q["option3"], 'D': q["option4"]}
-            diff_map = {1: "Easy", 2: "Medium", 3: "Hard"}
-            question_text = (
-                f"({diff_map.get(int(data['current_difficulty']), 'Medium')}) "
-                f"Question {int(data['asked_count'])}/{int(data['total_questions'])}:\n"
-                f"{q['text']}\n\n" + "\n".join([f"{k}. {v}" for k, v in options.items()])
+            return render_question(
+                dispatcher, data["question"],
+                data["asked_count"], data["total_questions"], data["current_difficulty"]
             )
-            dispatcher.utter_message(text=question_text)
-
-            return [
-                SlotSet("question_id", str(q["id"])),
-                SlotSet("asked_count", float(data["asked_count"])),
-                SlotSet("total_questions", float(data["total_questions"])),
-                SlotSet("difficulty", float(data["current_difficulty"]))
-            ]
 
         except requests.exceptions.RequestException as e:
             dispatcher.utter_message(text="❌ Error connecting to the exam server. Please try again later.")
@@ -161,7 +166,17 @@ class ActionCheckAnswer(Action):
                     Restarted(),
                 ]
 
-            # Not done yet → persist new state and immediately fetch the next question
+            # Not done yet → show the precomputed next question if the server sent one
+            next_question = result.get("next_question")
+            if next_question:
+                return [SlotSet("score", new_score)] + render_question(
+                    dispatcher, next_question,
+                    int(result.get("asked_count", 0)) + 1,  # position incl. the new question
+                    result.get("total_questions", 0),
+                    result.get("current_difficulty", 2),
+                )
+
+            # no precomputed branch (e.g. the bank changed) → fetch one
             return [
                 SlotSet("score", new_score),
                 SlotSet("question_id", None),  # we're about to fetch a new one
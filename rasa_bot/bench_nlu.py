@@ -0,0 +1,51 @@
+# bench_nlu.py
+# Per-message NLU latency with and without the A/B/C/D fast path.
+# Usage (after `rasa train`):  python bench_nlu.py [models/<model>.tar.gz] [rounds]
+import asyncio
+import statistics
+import sys
+import time
+
+from rasa.core.agent import Agent
+from rasa.model import get_latest_model
+
+from components import answer_fast_path
+
+ANSWERS = ["A", "b", " C ", "d"]
+OTHERS = ["Start exam", "Hello", "Thanks a lot", "Goodbye"]
+
+
+async def measure(agent: Agent, texts, rounds: int):
+    timings = []
+    for _ in range(rounds):
+        for text in texts:
+            start = time.perf_counter()
+            await agent.parse_message(text)
+            timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        "mean_ms": statistics.mean(timings),
+        "p50_ms": timings[len(timings) // 2],
+        "p99_ms": timings[int(len(timings) * 0.99) - 1],
+    }
+
+
+async def main():
+    model_path = sys.argv[1] if len(sys.argv) > 1 else get_latest_model("models")
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 250
+    agent = Agent.load(model_path)
+
+    # warm up TF graphs before timing anything
+    await measure(agent, ANSWERS + OTHERS, 5)
+
+    for enabled in (False, True):
+        answer_fast_path.ENABLED = enabled
+        label = "fast path" if enabled else "baseline "
+        for name, texts in (("answers", ANSWERS), ("other  ", OTHERS)):
+            r = await measure(agent, texts, rounds)
+            print(f"{label} {name}: mean {r['mean_ms']:.2f} ms | "
+                  f"p50 {r['p50_ms']:.2f} ms | p99 {r['p99_ms']:.2f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
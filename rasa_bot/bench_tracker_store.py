@@ -0,0 +1,86 @@
+# bench_tracker_store.py
+# Memory / latency of the default in-memory store vs CompactSQLiteTrackerStore
+# for long exams. Usage: python bench_tracker_store.py [conversations] [questions]
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from rasa.core.tracker_store import InMemoryTrackerStore
+from rasa.shared.core.domain import Domain
+from rasa.shared.core.events import ActionExecuted, BotUttered, Restarted, SlotSet, UserUttered
+from rasa.shared.core.trackers import DialogueStateTracker
+
+from compact_tracker_store import CompactSQLiteTrackerStore
+
+
+def question_events(n: int):
+    """Events one answered question adds (mirrors ActionCheckAnswer + ActionFetchQuestion)."""
+    return [
+        UserUttered("A", intent={"name": "answer_question", "confidence": 1.0}),
+        ActionExecuted("action_check_answer"),
+        BotUttered(f"✅ Correct! (+1 point)\nCurrent score: {n} | Next difficulty: 2"),
+        SlotSet("score", float(n)),
+        SlotSet("question_id", None),
+        SlotSet("difficulty", 2.0),
+        SlotSet("asked_count", float(n)),
+        SlotSet("total_questions", 200.0),
+        ActionExecuted("action_fetch_question"),
+        BotUttered(f"(Medium) Question {n + 1}/200:\nSome question text\n\nA. a\nB. b\nC. c\nD. d"),
+        SlotSet("question_id", str(n + 1)),
+        SlotSet("asked_count", float(n + 1)),
+        SlotSet("total_questions", 200.0),
+        SlotSet("difficulty", 2.0),
+        ActionExecuted("action_listen"),
+    ]
+
+
+async def run(store, domain: Domain, conversations: int, questions: int):
+    save_s = 0.0
+    retrieve_s = 0.0
+    tracemalloc.start()
+    for c in range(conversations):
+        sender_id = f"candidate-{c}"
+        tracker = DialogueStateTracker(sender_id, domain.slots)
+        for n in range(questions):
+            tracker.update_with_events(question_events(n), domain)
+            start = time.perf_counter()
+            await store.save(tracker)
+            save_s += time.perf_counter() - start
+        # retrieve at the end of the exam, when the tracker is largest
+        start = time.perf_counter()
+        await store.retrieve(sender_id)
+        retrieve_s += time.perf_counter() - start
+
+        tracker.update(Restarted())
+        await store.save(tracker)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    saves = conversations * questions
+    return {
+        "save_ms": save_s * 1000 / saves,
+        "retrieve_ms": retrieve_s * 1000 / conversations,
+        "peak_mb": peak / 1e6,
+    }
+
+
+async def main():
+    conversations = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    questions = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    domain = Domain.load("domain.yml")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        stores = [
+            ("in-memory", InMemoryTrackerStore(domain)),
+            ("compact  ", CompactSQLiteTrackerStore(domain, db=os.path.join(tmp, "trackers.db"))),
+        ]
+        for label, store in stores:
+            r = await run(store, domain, conversations, questions)
+            print(f"{label}: save {r['save_ms']:.3f} ms/question | "
+                  f"retrieve {r['retrieve_ms']:.3f} ms | peak {r['peak_mb']:.1f} MB")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,92 @@
+# answer_fast_path.py
+import os
+import re
+from typing import Any, Dict, List, Text
+
+from rasa.engine.graph import ExecutionContext, GraphComponent
+from rasa.engine.recipes.default_recipe import DefaultV1Recipe
+from rasa.engine.storage.resource import Resource
+from rasa.engine.storage.storage import ModelStorage
+from rasa.nlu.classifiers.diet_classifier import DIETClassifier
+from rasa.shared.nlu.constants import (
+    ENTITIES,
+    INTENT,
+    INTENT_NAME_KEY,
+    INTENT_RANKING_KEY,
+    PREDICTED_CONFIDENCE_KEY,
+    TEXT,
+)
+from rasa.shared.nlu.training_data.message import Message
+
+# Set RASA_ANSWER_FAST_PATH=0 to route every message through DIET again
+# (bench_nlu.py flips this at runtime to compare both paths).
+ENABLED = os.environ.get("RASA_ANSWER_FAST_PATH", "1") != "0"
+
+# Message property marking messages that were already classified here.
+FAST_PATH_KEY = "answer_fast_path"
+
+
+@DefaultV1Recipe.register(
+    [DefaultV1Recipe.ComponentType.INTENT_CLASSIFIER], is_trainable=False
+)
+class AnswerFastPathClassifier(GraphComponent):
+    """
+    Classifies bare A/B/C/D replies with a compiled pattern.
+    Must run before the featurizers so later classifiers can skip them.
+    """
+
+    @staticmethod
+    def get_default_config() -> Dict[Text, Any]:
+        return {
+            "intent": "answer_question",
+            # same inputs ActionCheckAnswer accepts after strip().upper()
+            "pattern": r"^\s*[A-Da-d]\s*$",
+        }
+
+    def __init__(self, config: Dict[Text, Any]) -> None:
+        self.intent = config["intent"]
+        self.pattern = re.compile(config["pattern"])
+
+    @classmethod
+    def create(
+        cls,
+        config: Dict[Text, Any],
+        model_storage: ModelStorage,
+        resource: Resource,
+        execution_context: ExecutionContext,
+    ) -> GraphComponent:
+        return cls(config)
+
+    def process(self, messages: List[Message]) -> List[Message]:
+        if not ENABLED:
+            return messages
+        for message in messages:
+            text = message.get(TEXT) or ""
+            if not self.pattern.match(text):
+                continue
+            intent = {INTENT_NAME_KEY: self.intent, PREDICTED_CONFIDENCE_KEY: 1.0}
+            message.set(INTENT, intent, add_to_output=True)
+            message.set(INTENT_RANKING_KEY, [intent], add_to_output=True)
+            message.set(ENTITIES, [], add_to_output=True)
+            message.set(FAST_PATH_KEY, True)
+        return messages
+
+
+@DefaultV1Recipe.register(
+    [
+        DefaultV1Recipe.ComponentType.INTENT_CLASSIFIER,
+        DefaultV1Recipe.ComponentType.ENTITY_EXTRACTOR,
+    ],
+    is_trainable=True,
+)
+class FastPathDIETClassifier(DIETClassifier):
+    """
+    DIETClassifier that leaves fast-path messages untouched.
+    Training is unchanged; only inference is skipped.
+    """
+
+    def process(self, messages: List[Message]) -> List[Message]:
+        pending = [m for m in messages if not m.get(FAST_PATH_KEY)]
+        if pending:
+            super().process(pending)
+        return messages